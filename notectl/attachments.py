@@ -2,16 +2,39 @@
 
 import os
 import re
+import errno
+import shutil
+import hashlib
 import glob
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Set
+from urllib.parse import unquote
 import subprocess
 from .git import take_git_snapshot as take_snapshot
+from .journal import MoveJournal, fsync_directory, fsync_file
+from .metrics import metrics
 from rich import print
 
 
+QUARANTINE_FOLDER_NAME = ".quarantine"
+
+# Used by the garbage collector's mark phase.
+WIKILINK_PATTERN = r"!?\[\[([^\]|#]+)(?:[#|][^\]]*)?\]\]"
+HTML_REFERENCE_PATTERN = r"""\b(?:src|href)\s*=\s*(?:"([^"]*)"|'([^']*)')"""
+IA_PATH_PATTERN = r"^\s*(?:\./|/|\.\./)[^\n]+\.\S+\s*$"
+
+# How many moves or rewrites are committed to the journal per fsync.
+TIDY_BATCH_SIZE = 100
+
+# Concurrent moves; bounded so large cross-device copies don't thrash the disk.
+MOVE_WORKERS = 4
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
 @dataclass
 class AttachmentRef:
     id: str
@@ -84,76 +107,594 @@ def is_path_in_attachments_folder(attachments_folder: Path, attachment_string) -
     return attachment_path.parent == attachments_folder
 
 
-def move_to_attachments_folder(attachment: AttachmentRef, attachments_folder: Path, dry_run=False):
-    new_path = attachments_folder / attachment.attachment_path.name
-    if not attachment.attachment_path.is_file():
-        print(f"Error: {attachment.attachment_path} does not exist.")
-        return
+@dataclass
+class PlannedMove:
+    source: Path
+    destination: Path
+
+
+@dataclass
+class PlannedRewrite:
+    file_path: Path
+    line_num: int
+    old_string: str
+    new_string: str
+    # Index into the plan's moves; the rewrite only applies once it's moved.
+    move_index: int
+
+
+@dataclass
+class TidyPlan:
+    moves: List[PlannedMove]
+    rewrites: List[PlannedRewrite]
+
+    def to_dict(self) -> dict:
+        return {
+            "moves": [[str(m.source), str(m.destination)] for m in self.moves],
+            "rewrites": [
+                [str(r.file_path), r.line_num, r.old_string, r.new_string, r.move_index]
+                for r in self.rewrites
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TidyPlan":
+        return cls(
+            moves=[PlannedMove(Path(s), Path(d)) for s, d in data["moves"]],
+            rewrites=[
+                PlannedRewrite(Path(f), line_num, old, new, move_index)
+                for f, line_num, old, new, move_index in data["rewrites"]
+            ],
+        )
+
+
+def get_destination_path(source: Path, attachments_folder: Path, reserved: Set[Path]) -> Path:
+    new_path = attachments_folder / source.name
+    # If the new path already exists, increment a number in the file name
+    base_name = new_path.stem
+    suffix = new_path.suffix
+    counter = 1
+    while new_path.exists() or new_path in reserved:
+        new_path = new_path.with_name(f"{base_name} {counter}{suffix}")
+        counter += 1
+    reserved.add(new_path)
+    return new_path
 
-    if new_path.is_file():
-        # If the new path already exists, increment a number in the file name
-        base_name = new_path.stem
-        suffix = new_path.suffix
-        counter = 1
 
-        while new_path.exists():
-            new_path = new_path.with_name(f"{base_name} {counter}{suffix}")
-            counter += 1
+def plan_tidy(attachments_folder: Path, attachment_references: List[AttachmentRef]) -> TidyPlan:
+    moves = []
+    rewrites = []
+    reserved = set()
+    move_indices = {}
+    for attachment in attachment_references:
+        source = attachment.attachment_path
+        # The same attachment may be referenced from several places.
+        if source not in move_indices:
+            destination = get_destination_path(source, attachments_folder, reserved)
+            move_indices[source] = len(moves)
+            moves.append(PlannedMove(source, destination))
+        move_index = move_indices[source]
+        relative_path = os.path.relpath(
+            moves[move_index].destination, attachment.file_path.parent
+        )
+        rewrites.append(
+            PlannedRewrite(
+                attachment.file_path,
+                attachment.line_num,
+                attachment.found_string,
+                relative_path,
+                move_index,
+            )
+        )
+    return TidyPlan(moves, rewrites)
 
+
+def copy_file_contents(source_fd: int, destination_fd: int, size: int):
+    """
+    Copies in the kernel where possible: copy_file_range, then sendfile,
+    then a plain userspace copy.
+    """
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                sent = os.copy_file_range(source_fd, destination_fd, size - copied)
+                if sent == 0:
+                    break
+                copied += sent
+            return copied
+        except OSError as e:
+            # Some kernels refuse copy_file_range across filesystems.
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
     try:
-        if not dry_run:
-            attachment.attachment_path.rename(new_path)
-        attachment.attachment_path = new_path
-        # print("Moving %s to attachments" % (attachment.attachment_path.name))
+        while copied < size:
+            sent = os.sendfile(destination_fd, source_fd, copied, size - copied)
+            if sent == 0:
+                break
+            copied += sent
+        return copied
+    except OSError as e:
+        if e.errno not in (errno.ENOSYS, errno.EINVAL, errno.ENOTSOCK, errno.EOPNOTSUPP):
+            raise
+    os.lseek(source_fd, copied, os.SEEK_SET)
+    os.lseek(destination_fd, copied, os.SEEK_SET)
+    while chunk := os.read(source_fd, COPY_CHUNK_SIZE):
+        copied += os.write(destination_fd, chunk)
+    return copied
+
+
+def hash_file(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def copy_across_devices(source: Path, destination: Path):
+    """
+    Copies to a hidden partial file, verifies its size, atomically renames it
+    into place and only then unlinks the source.
+    """
+    partial_path = destination.with_name(f".{destination.name}.partial")
+    try:
+        with open(source, "rb") as src, open(partial_path, "wb") as dst:
+            size = os.fstat(src.fileno()).st_size
+            copied = copy_file_contents(src.fileno(), dst.fileno(), size)
+            dst.flush()
+            os.fsync(dst.fileno())
+            written = os.fstat(dst.fileno()).st_size
+        if copied != size or written != size:
+            raise OSError(f"Copied {written} of {size} bytes from {source}")
+        shutil.copystat(source, partial_path)
+        os.replace(partial_path, destination)
+    except BaseException:
+        # E.g. ENOSPC halfway through a large copy, or an interrupt.
+        partial_path.unlink(missing_ok=True)
+        raise
+    fsync_directory(destination.parent)
+    source.unlink()
+
+
+def move_to_attachments_folder(move: PlannedMove) -> bool:
+    """
+    Idempotent: a move that already happened (e.g. before a crash) succeeds.
+    """
+    if not move.source.is_file():
+        if move.destination.is_file():
+            return True
+        print(f"Error: {move.source} does not exist.")
+        return False
+    if move.destination.exists():
+        # A cross-device copy may have landed before the source was unlinked.
+        if move.destination.stat().st_size == move.source.stat().st_size and hash_file(
+            move.destination
+        ) == hash_file(move.source):
+            move.source.unlink()
+            return True
+        print(f"Error: {move.destination} already exists.")
+        return False
+    try:
+        move.source.rename(move.destination)
+        return True
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            print(f"Error while renaming: {e}")
+            return False
+    try:
+        copy_across_devices(move.source, move.destination)
+        return True
     except Exception as e:
-        print(f"Error while renaming: {e}")
-
-
-def run_collector(attachments_folder: Path, folders_to_tidy, dry_run=False):
-    attachment_references = []
-    for folder in folders_to_tidy:
-        markdown_files = glob.glob(f"{folder}/**/*.md", recursive=True)
-        for file_path in markdown_files:
-            images = find_attachment_references(file_path)
-            attachment_references.extend(images)
-    # Find all paths not in the desired attachments folder.
-    attachment_references = [
-        attachment
-        for attachment in attachment_references
-        if not is_path_in_attachments_folder(attachments_folder, attachment)
+        print(f"Error while copying across devices: {e}")
+        return False
+
+
+def get_reference_token_pattern(reference: str) -> re.Pattern:
+    """
+    Matches a reference only as a whole destination: bounded by the line
+    edges, whitespace, parentheses, angle brackets or a title's quote.
+    Plain substring checks would confuse `att/q.png` with `sub/att/q.png`.
+    """
+    return re.compile(r"(?<![^\s(<])" + re.escape(reference) + r"(?=[\s)>\"]|$)")
+
+
+def has_reference_token(line: str, reference: str) -> bool:
+    return get_reference_token_pattern(reference).search(line) is not None
+
+
+def replace_reference_token(line: str, old_reference: str, new_reference: str) -> str:
+    return get_reference_token_pattern(old_reference).sub(
+        lambda _: new_reference, line
+    )
+
+
+def get_staged_path(file_path: Path) -> Path:
+    return file_path.with_name(f".{file_path.name}.tidy-tmp")
+
+
+def stage_attachment_references(
+    file_path: Path, rewrites: List[PlannedRewrite], undo=False
+) -> Optional[Path]:
+    """
+    Writes the note with every rewrite (or undo) applied to a hidden file
+    next to it, leaving the note itself untouched. Returns None if nothing
+    changes.
+    """
+    with open(file_path, encoding="utf-8") as file:
+        lines = file.readlines()
+
+    changed = False
+    for rewrite in rewrites:
+        line_num = rewrite.line_num
+        if not 1 <= line_num <= len(lines):
+            print(f"Line number {line_num} is out of range.")
+            continue
+        old_line = lines[line_num - 1]
+        old_string, new_string = rewrite.old_string, rewrite.new_string
+        if undo:
+            old_string, new_string = new_string, old_string
+        new_line = replace_reference_token(old_line, old_string, new_string)
+        if new_line == old_line:
+            # Already applied before an interruption, or edited since.
+            if not undo and not has_reference_token(old_line, new_string):
+                print(f"[yellow]Reference {old_string} not found in {file_path}:{line_num}[/yellow]")
+            continue
+        print(f"[green]{old_line.strip()} -> {new_line.strip()}[/green]")
+        lines[line_num - 1] = new_line
+        changed = True
+
+    if not changed:
+        return None
+    staged_path = get_staged_path(file_path)
+    with open(staged_path, "w", encoding="utf-8") as file:
+        file.writelines(lines)
+    shutil.copymode(file_path, staged_path)
+    return staged_path
+
+
+def commit_staged_files(staged: Dict[Path, Path]):
+    """
+    Flushes a batch of staged notes together, so the filesystem can group
+    their journal commits, then renames each over its note and flushes
+    every folder once. A crash leaves each note either old or new, never torn.
+    """
+    if len(staged) == 0:
+        return
+    with ThreadPoolExecutor(max_workers=MOVE_WORKERS) as executor:
+        list(executor.map(fsync_file, staged.values()))
+    for file_path, staged_path in staged.items():
+        os.replace(staged_path, file_path)
+        metrics.increment("files_written")
+    for folder in {file_path.parent for file_path in staged}:
+        fsync_directory(folder)
+
+
+def rewrite_attachment_references(file_path: Path, rewrites: List[PlannedRewrite], undo=False):
+    """
+    Applies (or undoes) every rewrite for a single file, replacing it atomically.
+    """
+    staged_path = stage_attachment_references(file_path, rewrites, undo=undo)
+    if staged_path is not None:
+        commit_staged_files({file_path: staged_path})
+
+
+def group_rewrites_by_file(plan: TidyPlan, indices) -> Dict[Path, List[int]]:
+    by_file = {}
+    for idx in indices:
+        by_file.setdefault(plan.rewrites[idx].file_path, []).append(idx)
+    return by_file
+
+
+def apply_tidy_plan(
+    plan: TidyPlan,
+    journal: MoveJournal,
+    moved: Set[int],
+    rewritten: Set[int],
+    batch_size=TIDY_BATCH_SIZE,
+) -> bool:
+    """
+    Moves first, then rewrites, checkpointing each batch in the journal.
+    Returns whether every step of the plan was committed.
+    """
+    failed_moves = set()
+    pending = []
+    todo = [idx for idx in range(len(plan.moves)) if idx not in moved]
+    # Renames are instant, but cross-device copies of large media are not.
+    with metrics.phase("move"), ThreadPoolExecutor(max_workers=MOVE_WORKERS) as executor:
+        results = executor.map(lambda idx: move_to_attachments_folder(plan.moves[idx]), todo)
+        for idx, ok in zip(todo, results):
+            if not ok:
+                failed_moves.add(idx)
+                continue
+            metrics.increment("attachments_moved")
+            pending.append(idx)
+            if len(pending) >= batch_size:
+                commit_moves(plan, journal, pending)
+                pending = []
+        commit_moves(plan, journal, pending)
+
+    # Never point a note at an attachment that didn't make it.
+    remaining = [
+        idx
+        for idx, rewrite in enumerate(plan.rewrites)
+        if idx not in rewritten and rewrite.move_index not in failed_moves
     ]
+    pending = []
+    staged = {}
+    with metrics.phase("rewrite"):
+        for file_path, indices in group_rewrites_by_file(plan, remaining).items():
+            staged_path = stage_attachment_references(
+                file_path, [plan.rewrites[idx] for idx in indices]
+            )
+            if staged_path is not None:
+                staged[file_path] = staged_path
+            pending.extend(indices)
+            if len(pending) >= batch_size:
+                commit_staged_files(staged)
+                journal.checkpoint("rewritten", pending)
+                pending, staged = [], {}
+        commit_staged_files(staged)
+        journal.checkpoint("rewritten", pending)
+
+    return len(failed_moves) == 0
+
+
+def commit_moves(plan: TidyPlan, journal: MoveJournal, indices: List[int]):
+    if len(indices) == 0:
+        return
+    folders = set()
+    for idx in indices:
+        folders.add(plan.moves[idx].source.parent)
+        folders.add(plan.moves[idx].destination.parent)
+    for folder in folders:
+        fsync_directory(folder)
+    journal.checkpoint("moved", indices)
+
+
+def rollback_tidy(journal: MoveJournal):
+    plan, _, _ = journal.load()
+    if plan is None:
+        print("[bold red]Error:[/bold red] The tidy journal has no plan, nothing to roll back.")
+        exit(1)
+    plan = TidyPlan.from_dict(plan)
+
+    # Undo every rewrite that may have landed, then move files back.
+    for file_path, indices in group_rewrites_by_file(plan, range(len(plan.rewrites))).items():
+        if not file_path.is_file():
+            continue
+        rewrite_attachment_references(
+            file_path, [plan.rewrites[idx] for idx in indices], undo=True
+        )
+    for move in reversed(plan.moves):
+        if move.destination.is_file() and not move.source.exists():
+            move_to_attachments_folder(PlannedMove(move.destination, move.source))
+
+    journal.remove()
+    print("Rolled back the interrupted tidy.")
 
-    print("Relocating %s attachments" % len(attachment_references))
 
-    if len(attachment_references) == 0:
-        print("No attachments to relocate.")
-        exit(0)
+def run_collector(
+    attachments_folder: Path, folders_to_tidy, dry_run=False, resume=False, rollback=False
+):
+    journal = MoveJournal(attachments_folder)
+
+    if rollback or resume:
+        if not journal.exists():
+            print("No interrupted tidy to recover.")
+            exit(0)
+        if rollback:
+            rollback_tidy(journal)
+            return
+        plan, moved, rewritten = journal.load()
+        if plan is None:
+            print("[bold red]Error:[/bold red] The tidy journal has no plan, nothing to resume.")
+            exit(1)
+        plan = TidyPlan.from_dict(plan)
+        print(
+            "Resuming: %s/%s moves and %s/%s rewrites already committed"
+            % (len(moved), len(plan.moves), len(rewritten), len(plan.rewrites))
+        )
     else:
+        if journal.exists():
+            print(
+                "[bold red]Error:[/bold red] A previous tidy was interrupted. "
+                "Run with [bold cyan]--resume[/bold cyan] or [bold cyan]--rollback[/bold cyan]."
+            )
+            exit(1)
+
+        attachment_references = []
+        with metrics.phase("scan"):
+            for folder in folders_to_tidy:
+                markdown_files = glob.glob(f"{folder}/**/*.md", recursive=True)
+                for file_path in markdown_files:
+                    metrics.increment("files_scanned")
+                    metrics.increment("bytes_read", os.path.getsize(file_path))
+                    images = find_attachment_references(file_path)
+                    attachment_references.extend(images)
+        # Find all paths not in the desired attachments folder.
+        attachment_references = [
+            attachment
+            for attachment in attachment_references
+            if not is_path_in_attachments_folder(attachments_folder, attachment)
+        ]
+
+        print("Relocating %s attachments" % len(attachment_references))
+
+        if len(attachment_references) == 0:
+            print("No attachments to relocate.")
+            exit(0)
+
+        plan = plan_tidy(attachments_folder, attachment_references)
+        moved, rewritten = set(), set()
+
+        if dry_run:
+            for rewrite in plan.rewrites:
+                print(f"[green]{rewrite.old_string} -> {rewrite.new_string}[/green]")
+            return
+
         # Take a snapshot of the directory
-        take_snapshot()
+        with metrics.phase("snapshot"):
+            take_snapshot()
+        journal.begin(plan.to_dict())
 
-    for attachment in attachment_references:
-        move_to_attachments_folder(attachment, attachments_folder, dry_run=dry_run)
+    if apply_tidy_plan(plan, journal, moved, rewritten):
+        journal.remove()
+    else:
+        print(
+            "[yellow]Some attachments could not be moved. Fix the errors above and "
+            "run with [bold cyan]--resume[/bold cyan] to retry.[/yellow]"
+        )
 
-    # Now, write step.
-    for attachment in attachment_references:
-        with open(attachment.file_path, encoding="utf-8") as file:
-            lines = file.readlines()
 
-        # Modify the desired line
-        line_num = attachment.line_num
-        old_line = lines[line_num - 1]
-        relative_path = os.path.relpath(
-            attachment.attachment_path, attachment.file_path.parent
+@dataclass
+class ReferenceMarks:
+    # Resolved paths of referenced files.
+    paths: Set[Path]
+    # File names from [[name]] links and ![[name]] embeds, which resolve
+    # anywhere in the vault.
+    wikilink_names: Set[str]
+    # (note, reference) pairs that don't resolve to any file.
+    unresolved: List[tuple]
+
+
+def get_link_destination(inner: str) -> str:
+    inner = inner.strip()
+    if inner.startswith("<"):
+        return inner[1 : inner.find(">")] if ">" in inner else inner[1:]
+    # Drop an optional "title".
+    return re.sub(r'\s+"[^"]*"$', "", inner)
+
+
+def find_link_destinations(content: str) -> List[str]:
+    """
+    Destinations of Markdown links and images. Parentheses may nest inside
+    them, as in `Screenshot (1).png`; an unclosed one runs to the line end.
+    """
+    destinations = []
+    for match in re.finditer(r"\]\(", content):
+        start = match.end()
+        end = content.find("\n", start)
+        end = len(content) if end == -1 else end
+        depth = 0
+        in_brackets = content[start:end].lstrip().startswith("<")
+        for idx in range(start, end):
+            char = content[idx]
+            if in_brackets:
+                in_brackets = char != ">" or idx == start
+            elif char == "(":
+                depth += 1
+            elif char == ")":
+                if depth == 0:
+                    end = idx
+                    break
+                depth -= 1
+        destinations.append(get_link_destination(content[start:end]))
+    return destinations
+
+
+def resolve_reference_candidates(vault_root: Path, note_path: Path, reference: str) -> List[Path]:
+    candidates = []
+    # Also without a #fragment or ?query, e.g. `file.pdf#page=2`.
+    stripped = re.sub(r"[#?].*$", "", reference)
+    for variant in dict.fromkeys([reference, unquote(reference), stripped, unquote(stripped)]):
+        candidates.append(resolve_attachment_path(note_path.parent, variant))
+        if variant.startswith("/"):
+            candidates.append((vault_root / variant.lstrip("/")).resolve())
+    return [path for path in candidates if path.is_file()]
+
+
+def mark_note_references(vault_root: Path, note_path: Path, marks: ReferenceMarks):
+    with open(note_path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    for match in re.finditer(WIKILINK_PATTERN, content):
+        marks.wikilink_names.add(os.path.basename(match.group(1).strip()))
+
+    references = find_link_destinations(content)
+    references.extend(
+        first or second for first, second in re.findall(HTML_REFERENCE_PATTERN, content)
+    )
+    references.extend(
+        match.strip() for match in re.findall(IA_PATH_PATTERN, content, re.MULTILINE)
+    )
+    for reference in references:
+        if reference == "" or re.match(r"^[a-z][a-z0-9+.-]*:", reference) or reference.startswith("#"):
+            # URLs, mailto: and in-note anchors.
+            continue
+        resolved = resolve_reference_candidates(vault_root, note_path, reference)
+        if resolved:
+            marks.paths.update(resolved)
+        elif Path(unquote(reference)).suffix != ".md":
+            # A broken note link can't hide an attachment, anything else might.
+            marks.unresolved.append((note_path, reference))
+
+
+def mark_referenced_attachments(vault_root: Path) -> ReferenceMarks:
+    """
+    Mark phase: every attachment referenced by any note in the vault, through
+    Markdown links and images (URL-encoded or <bracketed>), HTML src and href
+    attributes, iA Writer content blocks, [[links]] and ![[embeds]].
+    """
+    marks = ReferenceMarks(set(), set(), [])
+    for file_path in glob.glob(f"{vault_root}/**/*.md", recursive=True):
+        mark_note_references(vault_root, Path(file_path), marks)
+    return marks
+
+
+def sweep_unreferenced_attachments(attachments_folder: Path, marks: ReferenceMarks) -> List[Path]:
+    """
+    Sweep phase: files in the attachments folder that weren't marked.
+    Hidden files and folders (including the quarantine) and notes are skipped.
+    """
+    unreferenced = []
+    for root, dirs, files in os.walk(attachments_folder):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if name.startswith(".") or name.endswith(".md"):
+                continue
+            path = (Path(root) / name).resolve()
+            if path not in marks.paths and name not in marks.wikilink_names:
+                unreferenced.append(path)
+    return sorted(unreferenced)
+
+
+def run_garbage_collector(vault_root: Path, attachments_folder: Path, quarantine=False):
+    marks = mark_referenced_attachments(vault_root)
+    unreferenced = sweep_unreferenced_attachments(attachments_folder, marks)
+
+    for note_path, reference in marks.unresolved:
+        print(f"[yellow]Unresolved reference: {reference} in {note_path}[/yellow]")
+
+    if len(unreferenced) == 0:
+        print("No unreferenced attachments.")
+        return
+
+    total_size = sum(path.stat().st_size for path in unreferenced)
+    for path in unreferenced:
+        print(f"[yellow]Unreferenced: {path.relative_to(attachments_folder)}[/yellow]")
+    print(
+        "Found %s unreferenced attachments (%.1f MB)"
+        % (len(unreferenced), total_size / 1024 / 1024)
+    )
+
+    if not quarantine:
+        return
+
+    if len(marks.unresolved) > 0:
+        # Any of those could be pointing at a file listed above.
+        print(
+            f"[bold red]Error:[/bold red] Refusing to quarantine while {len(marks.unresolved)} "
+            "references can't be resolved. Fix them and run again."
         )
-        new_line = old_line.replace(attachment.found_string, relative_path)
-        print(f"[green]{old_line.strip()} -> {new_line.strip()}[/green]")
-        if 1 <= attachment.line_num <= len(lines):
-            lines[line_num - 1] = new_line
-        else:
-            print(f"Line number {line_num} is out of range.")
+        exit(1)
 
-        if not dry_run:
-            with open(attachment.file_path, "w", encoding="utf-8") as file:
-                file.writelines(lines)
+    # Take a snapshot of the directory
+    take_snapshot()
 
+    quarantine_folder = attachments_folder / QUARANTINE_FOLDER_NAME
+    for path in unreferenced:
+        new_path = quarantine_folder / path.relative_to(attachments_folder)
+        new_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            path.rename(new_path)
+        except Exception as e:
+            print(f"Error while quarantining: {e}")
+    print(f"Quarantined {len(unreferenced)} attachments in {quarantine_folder}")
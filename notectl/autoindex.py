@@ -1,15 +1,31 @@
 import os
 import glob
+import json
+import heapq
 import argparse
 import uuid
 import re
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set, Tuple
 import datetime
-from .git import take_git_snapshot as take_snapshot
+from .git import (
+    take_git_snapshot as take_snapshot,
+    get_changed_paths,
+    get_head_commit,
+    get_last_snapshot_commit,
+)
+from .config import get_vault_cache_dir
+from .metrics import metrics
 from pathlib import Path
 
 
+# Reading notes is mostly waiting on the disk (or a sync client), so threads help.
+INDEX_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+_worker_pool = None
+
+
 @dataclass
 class AutoindexConfig:
     id: str
@@ -143,6 +159,38 @@ def find_hashtags(text):
     return hashtags
 
 
+def get_title_from_path(path) -> str:
+    return os.path.basename(path).replace(".md", "")
+
+
+def parse_markdown_file(path, content: str) -> MarkdownFile:
+    """
+    Build a single MarkdownFile from its path and contents.
+    """
+    title = get_title_from_path(path)
+    autoindexes = find_autoindexes(content)
+    links = find_links(content)
+    tags = [tag.replace("#", "") for tag in find_hashtags(content)]
+    created_at, modified_at = get_file_timestamps(path)
+    return MarkdownFile(path, title, tags, links, autoindexes, created_at, modified_at)
+
+
+def get_worker_pool() -> ThreadPoolExecutor:
+    """
+    One pool per process, shared by every vault processed in it.
+    """
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = ThreadPoolExecutor(max_workers=INDEX_WORKERS)
+    return _worker_pool
+
+
+def read_markdown_file(path) -> Tuple[MarkdownFile, int]:
+    with open(path, "r") as f:
+        size = os.fstat(f.fileno()).st_size
+        return parse_markdown_file(path, f.read()), size
+
+
 def build_path_index(path) -> Dict[str, MarkdownFile]:
     """
     Build a dictionary of MarkdownFile objects, indexed by path.
@@ -154,20 +202,11 @@ def build_path_index(path) -> Dict[str, MarkdownFile]:
     # Create an empty dictionary
     index = {}
 
-    # Iterate over the files
-    for file in files:
-        # Read the file contents
-        with open(file, "r") as f:
-            content = f.read()
-            title = os.path.basename(file).replace(".md", "")
-            autoindexes = find_autoindexes(content)
-            links = find_links(content)
-            tags = [tag.replace("#", "") for tag in find_hashtags(content)]
-            created_at, modified_at = get_file_timestamps(file)
-            markdown_file = MarkdownFile(
-                file, title, tags, links, autoindexes, created_at, modified_at
-            )
-            index[title] = markdown_file
+    # Iterate over the files, reading them concurrently; map keeps the order.
+    for markdown_file, size in get_worker_pool().map(read_markdown_file, files):
+        metrics.increment("files_scanned")
+        metrics.increment("bytes_read", size)
+        index[markdown_file.title] = markdown_file
 
     return index
 
@@ -222,12 +261,59 @@ def get_links_by_autoindex_config(
     return references
 
 
-def render_backlinks_to_markdown_list(backlinks: List[MarkdownFile]) -> List[str]:
+SORT_KEYS = {
+    "modified": lambda x: x.modified_at,
+    "created": lambda x: x.created_at,
+    "title": lambda x: x.title.lower(),
+}
+
+
+def get_selection_from_autoindex(autoindex: AutoindexConfig) -> Tuple[str, str, Optional[int]]:
+    """
+    Reads the sort, order and limit attributes, falling back to the defaults
+    (oldest modified first, no limit) on invalid values.
+    """
+    sort = autoindex.filters.get("sort", "modified")
+    if sort not in SORT_KEYS:
+        print(f'Unknown sort="{sort}" in autoindex, using "modified".')
+        sort = "modified"
+    order = autoindex.filters.get("order", "asc")
+    if order not in ("asc", "desc"):
+        print(f'Unknown order="{order}" in autoindex, using "asc".')
+        order = "asc"
+    limit = autoindex.filters.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+            # An empty list would drop the "No entries yet." placeholder.
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            print(f'Invalid limit="{limit}" in autoindex, ignoring it.')
+            limit = None
+    return sort, order, limit
+
+
+def select_backlinks(
+    backlinks: List[MarkdownFile], sort="modified", order="asc", limit=None
+) -> List[MarkdownFile]:
+    key = SORT_KEYS[sort]
+    if limit is None:
+        return sorted(backlinks, key=key, reverse=order == "desc")
+    # Top-k with a heap: O(n log k) instead of sorting every backlink.
+    if order == "desc":
+        return heapq.nlargest(limit, backlinks, key=key)
+    return heapq.nsmallest(limit, backlinks, key=key)
+
+
+def render_backlinks_to_markdown_list(
+    backlinks: List[MarkdownFile], sort="modified", order="asc", limit=None
+) -> List[str]:
     if len(backlinks) == 0:
         return ["- No entries yet.\n"]
     return [
         "- [[" + file.title + "]]\n"
-        for file in sorted(backlinks, key=lambda x: x.modified_at)
+        for file in select_backlinks(backlinks, sort=sort, order=order, limit=limit)
     ]
 
 
@@ -267,38 +353,223 @@ def insert_at_autoindex(file_content_lines, autoindex, rendered_list):
     return file_content_lines
 
 
-def run_autoindex(input_path: Path):
-    # Take a snapshot of the directory
-    take_snapshot()
-
-    # Call the function to process the path
-    index = build_path_index(input_path)
-
-    # Get all files with <autoindex /> tags.
-    autoindex_files = [file for file in index.values() if file.autoindexes is not None]
-    for file in autoindex_files:
-        with open(file.path, "r") as f:
-            file_content_lines = f.readlines()
-        # Fix indices.
-        prev_content = "".join(file_content_lines)
-        file_content_lines = apply_ids_to_autoindexes(
-            file_content_lines, file.autoindexes
+def get_autoindex_state_path(input_path: Path) -> Path:
+    return get_vault_cache_dir(input_path) / "autoindex-state.json"
+
+
+def serialize_markdown_file(file: MarkdownFile) -> dict:
+    return {
+        "path": file.path,
+        "title": file.title,
+        "tags": file.tags,
+        "links": file.links,
+        # Line numbers go stale, only the filters are needed to track dependencies.
+        "autoindexes": [a.filters for a in file.autoindexes]
+        if file.autoindexes is not None
+        else None,
+        "created_at": file.created_at.isoformat(),
+        "modified_at": file.modified_at.isoformat(),
+    }
+
+
+def deserialize_markdown_file(data: dict) -> MarkdownFile:
+    autoindexes = data["autoindexes"]
+    return MarkdownFile(
+        data["path"],
+        data["title"],
+        data["tags"],
+        data["links"],
+        [AutoindexConfig(str(uuid.uuid4()), filters) for filters in autoindexes]
+        if autoindexes is not None
+        else None,
+        datetime.datetime.fromisoformat(data["created_at"]),
+        datetime.datetime.fromisoformat(data["modified_at"]),
+    )
+
+
+def get_file_signature(path) -> Optional[List[int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def save_autoindex_state(
+    input_path: Path, index: Dict[str, MarkdownFile], written_paths: Optional[List[str]] = None
+):
+    state = {
+        "root": str(input_path),
+        "commit": get_head_commit(input_path),
+        "files": [serialize_markdown_file(file) for file in index.values()],
+        # Rewritten after the commit above, so git will report them as changed.
+        "written": {path: get_file_signature(path) for path in written_paths or []},
+    }
+    with open(get_autoindex_state_path(input_path), "w") as f:
+        json.dump(state, f)
+
+
+def load_autoindex_state(input_path: Path) -> Optional[dict]:
+    state_path = get_autoindex_state_path(input_path)
+    if not state_path.exists():
+        return None
+    try:
+        with open(state_path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def get_changed_paths_since(input_path: Path, changed_since: str) -> Optional[Set[str]]:
+    """
+    Asks git for the notes changed since a revision, or since the last
+    snapshot commit when `changed_since` is "snapshot".
+    """
+    revision = changed_since
+    if changed_since == "snapshot":
+        revision = get_last_snapshot_commit(input_path)
+        if revision is None:
+            print("No snapshot commit found, indexing the whole vault.")
+            return None
+    changed = get_changed_paths(input_path, revision)
+    if changed is None:
+        print(f"Could not ask git for changes since {revision}, indexing the whole vault.")
+    return changed
+
+
+def build_incremental_index(
+    input_path: Path, state: dict, changed_paths: Set[str]
+) -> Tuple[Dict[str, MarkdownFile], List[MarkdownFile]]:
+    """
+    Re-parses only the changed notes on top of the previous run's index.
+    Returns the index and the autoindex files whose results could change.
+    """
+    index = {}
+    for data in state["files"]:
+        file = deserialize_markdown_file(data)
+        index[file.title] = file
+    by_path = {file.path: file for file in index.values()}
+
+    written = state.get("written", {})
+    changed_titles = set()
+    # Titles linked from either version of a changed note; their backlinks move.
+    affected_titles = set()
+    for path in changed_paths:
+        if not path.endswith(".md"):
+            continue
+        if path in written and written[path] == get_file_signature(path):
+            # Only the previous run's own rewrite, which the state already has.
+            continue
+        old_file = by_path.get(path)
+        if old_file is not None:
+            index.pop(old_file.title, None)
+            changed_titles.add(old_file.title)
+            affected_titles.update(old_file.links)
+        if os.path.isfile(path) and Path(path).is_relative_to(input_path):
+            with open(path, "r") as f:
+                metrics.increment("files_scanned")
+                metrics.increment("bytes_read", os.fstat(f.fileno()).st_size)
+                new_file = parse_markdown_file(path, f.read())
+            index[new_file.title] = new_file
+            changed_titles.add(new_file.title)
+            affected_titles.update(new_file.links)
+
+    dirty_files = []
+    for file in index.values():
+        if file.autoindexes is None:
+            continue
+        depends_on_all = any(
+            autoindex.filters.get("mode") == "all" for autoindex in file.autoindexes
         )
-        for autoindex in file.autoindexes:
-            links_to_display = get_links_by_autoindex_config(file, index, autoindex)
-            rendered_index = render_backlinks_to_markdown_list(links_to_display)
-            file_content_lines = insert_at_autoindex(
-                file_content_lines, autoindex, rendered_index
-            )
-        file_content_lines = strip_ids_from_autoindexes(
-            file_content_lines, file.autoindexes
+        if (
+            file.title in changed_titles
+            or file.title in affected_titles
+            or (depends_on_all and len(changed_titles) > 0)
+        ):
+            dirty_files.append(file)
+    return index, dirty_files
+
+
+def reindex_file(file: MarkdownFile, index: Dict[str, MarkdownFile]) -> bool:
+    with open(file.path, "r") as f:
+        file_content_lines = f.readlines()
+    # Fix indices.
+    prev_content = "".join(file_content_lines)
+    file_content_lines = apply_ids_to_autoindexes(
+        file_content_lines, file.autoindexes
+    )
+    for autoindex in file.autoindexes:
+        metrics.increment("blocks_evaluated")
+        links_to_display = get_links_by_autoindex_config(file, index, autoindex)
+        sort, order, limit = get_selection_from_autoindex(autoindex)
+        rendered_index = render_backlinks_to_markdown_list(
+            links_to_display, sort=sort, order=order, limit=limit
         )
-        new_content = "".join(file_content_lines)
-        if prev_content != new_content:
-            print(f"Reindexed {file.path}")
+        file_content_lines = insert_at_autoindex(
+            file_content_lines, autoindex, rendered_index
+        )
+    file_content_lines = strip_ids_from_autoindexes(
+        file_content_lines, file.autoindexes
+    )
+    new_content = "".join(file_content_lines)
+    if prev_content != new_content:
+        print(f"Reindexed {file.path}")
         # Write!
         with open(file.path, "w") as f:
             f.write(new_content)
+        metrics.increment("files_written")
+        return True
+    return False
+
+
+def run_autoindex(input_path: Path, changed_since: Optional[str] = None):
+    # Ask git before the snapshot below commits the pending changes.
+    changed_paths = None
+    state = None
+    if changed_since is not None:
+        state = load_autoindex_state(input_path)
+        if state is None or state.get("root") != str(input_path):
+            print("No previous autoindex state, indexing the whole vault.")
+        else:
+            changed_paths = get_changed_paths_since(input_path, changed_since)
+            # Also cover anything changed since the state was saved.
+            if changed_paths is not None and state.get("commit"):
+                since_state = get_changed_paths(input_path, state["commit"])
+                changed_paths = (
+                    changed_paths | since_state if since_state is not None else None
+                )
+
+    # Take a snapshot of the directory
+    with metrics.phase("snapshot"):
+        take_snapshot()
+
+    with metrics.phase("scan"):
+        if changed_paths is not None:
+            index, autoindex_files = build_incremental_index(input_path, state, changed_paths)
+            print(
+                f"{len(changed_paths)} changed paths, {len(autoindex_files)} autoindex files to check"
+            )
+            # Line numbers aren't kept in the state, so re-parse before rewriting.
+            for idx, file in enumerate(autoindex_files):
+                with open(file.path, "r") as f:
+                    autoindex_files[idx] = parse_markdown_file(file.path, f.read())
+                index[file.title] = autoindex_files[idx]
+        else:
+            # Call the function to process the path
+            index = build_path_index(input_path)
+
+            # Get all files with <autoindex /> tags.
+            autoindex_files = [file for file in index.values() if file.autoindexes is not None]
+
+    written_paths = []
+    with metrics.phase("reindex"):
+        for file in autoindex_files:
+            if file.autoindexes is not None and reindex_file(file, index):
+                file.created_at, file.modified_at = get_file_timestamps(file.path)
+                written_paths.append(file.path)
+
+    with metrics.phase("save_state"):
+        save_autoindex_state(input_path, index, written_paths)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,8 @@
+import hashlib
+from contextlib import contextmanager
 from pathlib import Path
-from platformdirs import user_config_dir
+from typing import List
+from platformdirs import user_config_dir, user_cache_dir
 import tomllib
 import typer
 from rich import print
@@ -10,6 +13,12 @@ APP_AUTHOR = "matteing"
 CONFIG_DIR = user_config_dir(APP_NAME, APP_AUTHOR)
 CONFIG_FILE_NAME = "config.toml"
 
+# Set from `--vault`; None means the top-level config is the only vault.
+SELECTED_VAULTS: List[str] | None = None
+ACTIVE_VAULT: str | None = None
+
+_config_cache = None
+
 def init_config_dir() -> Path:
   config_dir = Path(CONFIG_DIR)
   config_dir.mkdir(parents=True, exist_ok=True)
@@ -50,14 +59,69 @@ def get_config_file(assert_exists=False) -> Path | None:
     return None
   return config_file
 
-def get_config_value(section: str, key: str, assert_value=True) -> str | None:
+def load_config() -> dict:
+  """
+  Parsed once per process (and again only if the file changes), since
+  every config lookup goes through here.
+  """
+  global _config_cache
   config_file = get_config_file(assert_exists=True)
-  if config_file is None:
-    return None
-  with config_file.open("rb") as f:
-    config = tomllib.load(f)
+  mtime = config_file.stat().st_mtime
+  if _config_cache is None or _config_cache[0] != (config_file, mtime):
+    with config_file.open("rb") as f:
+      _config_cache = ((config_file, mtime), tomllib.load(f))
+  return _config_cache[1]
+
+def get_vault_names() -> List[str]:
+  return list(load_config().get("vaults", {}).keys())
+
+def select_vaults(name: str) -> List[str]:
+  """
+  Selects the vault profile(s) from `--vault NAME|all`.
+  """
+  global SELECTED_VAULTS, ACTIVE_VAULT
+  names = get_vault_names()
+  if name == "all":
+    if len(names) == 0:
+      print("[bold red]Error:[/bold red] No vault profiles configured. Add [bold cyan][vaults.NAME.paths][/bold cyan] sections to the configuration file.")
+      raise typer.Exit(code=1)
+    SELECTED_VAULTS = names
+  elif name not in names:
+    print(f"[bold red]Error:[/bold red] Unknown vault: {name}. Configured vaults: {', '.join(names) or 'none'}")
+    raise typer.Exit(code=1)
+  else:
+    SELECTED_VAULTS = [name]
+  ACTIVE_VAULT = SELECTED_VAULTS[0] if len(SELECTED_VAULTS) == 1 else None
+  return SELECTED_VAULTS
+
+def get_selected_vaults() -> List[str | None]:
+  """
+  The vaults a command should process. None stands for the top-level config.
+  """
+  return SELECTED_VAULTS if SELECTED_VAULTS is not None else [None]
+
+@contextmanager
+def using_vault(name: str | None):
+  global ACTIVE_VAULT
+  previous = ACTIVE_VAULT
+  ACTIVE_VAULT = name
+  try:
+    yield
+  finally:
+    ACTIVE_VAULT = previous
+
+def get_config_value(section: str, key: str, assert_value=True) -> str | None:
+  config = load_config()
+  if SELECTED_VAULTS is not None and len(SELECTED_VAULTS) > 1 and ACTIVE_VAULT is None:
+    print("[bold red]Error:[/bold red] This command doesn't support [bold cyan]--vault all[/bold cyan].")
+    raise typer.Exit(code=1)
   try:
-    val = config[section][key]
+    # Vault profiles override the top-level sections key by key.
+    profile = config.get("vaults", {}).get(ACTIVE_VAULT, {}) if ACTIVE_VAULT else {}
+    if key in profile.get(section, {}):
+      val = profile[section][key]
+    else:
+      val = config[section][key]
     if assert_value:
       val = assert_value_exists(f"{section}.{key}", val)
     return val
@@ -83,4 +147,18 @@ def get_vault_path() -> Path:
 def get_vault_folder_path(key: str) -> Path:
   root_path = get_vault_path()
   folder_path = get_config_value("paths", key, assert_value=True)
-  return (root_path / folder_path).resolve(strict=True)
\ No newline at end of file
+  return (root_path / folder_path).resolve(strict=True)
+
+def get_cache_dir() -> Path:
+  cache_dir = Path(user_cache_dir(APP_NAME, APP_AUTHOR))
+  cache_dir.mkdir(parents=True, exist_ok=True)
+  return cache_dir
+
+def get_vault_cache_dir(vault_path: Path) -> Path:
+  """
+  Per-vault state lives outside the vault so snapshots don't pick it up.
+  """
+  digest = hashlib.sha1(str(vault_path).encode("utf-8")).hexdigest()[:16]
+  cache_dir = get_cache_dir() / "vaults" / digest
+  cache_dir.mkdir(parents=True, exist_ok=True)
+  return cache_dir
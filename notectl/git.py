@@ -19,4 +19,42 @@ def take_git_snapshot():
         subprocess.run(f"'{script_path}'", shell=True, check=True, cwd=vault_path)
     except subprocess.CalledProcessError as e:
         print("Error: Could not take snapshot.")
-        exit(1)
\ No newline at end of file
+        exit(1)
+
+def run_git(vault_path, *args) -> str | None:
+    """
+    Runs a git command in the vault, returning its output or None on failure.
+    """
+    try:
+        result = subprocess.run(
+            ["git", *args], cwd=vault_path, check=True, capture_output=True, text=True
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+    return result.stdout
+
+
+def get_head_commit(vault_path) -> str | None:
+    output = run_git(vault_path, "rev-parse", "--verify", "HEAD")
+    return output.strip() if output else None
+
+
+def get_last_snapshot_commit(vault_path) -> str | None:
+    output = run_git(vault_path, "log", "-1", "--format=%H", "--grep=^\\[snapshot\\]")
+    return output.strip() if output else None
+
+
+def get_changed_paths(vault_path, revision: str) -> set[str] | None:
+    """
+    Absolute paths of files changed since `revision`, including uncommitted,
+    deleted and untracked files. Returns None if git can't answer.
+    """
+    diff = run_git(vault_path, "diff", "--name-only", "--no-renames", "--relative", "-z", revision)
+    untracked = run_git(vault_path, "ls-files", "--others", "--exclude-standard", "-z")
+    if diff is None or untracked is None:
+        return None
+    return {
+        os.path.abspath(os.path.join(vault_path, name))
+        for name in (diff + untracked).split("\0")
+        if name
+    }
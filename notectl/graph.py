@@ -0,0 +1,107 @@
+import json
+from collections import Counter
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+from .autoindex import MarkdownFile, build_path_index
+
+
+@dataclass
+class GraphReport:
+    total_notes: int
+    total_links: int
+    # Titles of notes that no other note links to.
+    orphans: List[str]
+    # (source title, missing target title) pairs.
+    dead_links: List[Tuple[str, str]]
+    # (title, backlink count) pairs, most linked first.
+    hubs: List[Tuple[str, int]]
+
+
+def build_backlink_index(index: Dict[str, MarkdownFile]) -> Dict[str, Set[str]]:
+    """
+    Reverse link index: target title -> titles of the notes linking to it.
+    Targets don't need to exist, so dead links are kept too.
+    """
+    backlinks = {}
+    for file in index.values():
+        for target in file.links or []:
+            if target != file.title:
+                backlinks.setdefault(target, set()).add(file.title)
+    return backlinks
+
+
+def get_link_title(target: str) -> str:
+    """
+    The note title a link points at: `[[folder/Note#Heading]]` -> `Note`.
+    """
+    target = target.split("#", 1)[0].strip()
+    target = target.rsplit("/", 1)[-1]
+    return target[: -len(".md")] if target.endswith(".md") else target
+
+
+def build_graph_report(index: Dict[str, MarkdownFile], top: int = 10) -> GraphReport:
+    """
+    Computes orphans, dead links and hubs in a single pass over the link lists.
+    """
+    titles = set(index.keys())
+    in_degree = Counter()
+    dead_links = []
+    total_links = 0
+
+    for file in index.values():
+        # A note linking to the same title twice still counts as one backlink.
+        for target in set(map(get_link_title, file.links or [])):
+            total_links += 1
+            # `[[#Heading]]` points inside the note itself.
+            if target == file.title or target == "":
+                continue
+            if target in titles:
+                in_degree[target] += 1
+            else:
+                dead_links.append((file.title, target))
+
+    orphans = sorted(title for title in titles if in_degree[title] == 0)
+    hubs = in_degree.most_common(top) if top > 0 else []
+
+    return GraphReport(
+        total_notes=len(titles),
+        total_links=total_links,
+        orphans=orphans,
+        dead_links=sorted(dead_links),
+        hubs=hubs,
+    )
+
+
+def render_graph_report(report: GraphReport) -> str:
+    lines = [
+        f"Notes: {report.total_notes}",
+        f"Links: {report.total_links}",
+        "",
+        f"## Hubs ({len(report.hubs)})",
+    ]
+    lines.extend(f"- [[{title}]] ({count})" for title, count in report.hubs)
+    lines.append("")
+    lines.append(f"## Dead links ({len(report.dead_links)})")
+    lines.extend(f"- [[{source}]] -> [[{target}]]" for source, target in report.dead_links)
+    lines.append("")
+    lines.append(f"## Orphans ({len(report.orphans)})")
+    lines.extend(f"- [[{title}]]" for title in report.orphans)
+    return "\n".join(lines)
+
+
+def render_graph_report_json(report: GraphReport) -> str:
+    data = asdict(report)
+    data["dead_links"] = [
+        {"source": source, "target": target} for source, target in report.dead_links
+    ]
+    data["hubs"] = [{"title": title, "backlinks": count} for title, count in report.hubs]
+    return json.dumps(data, indent=2)
+
+
+def run_graph_report(input_path: Path, top: int = 10, output_format: str = "text") -> str:
+    index = build_path_index(input_path)
+    report = build_graph_report(index, top=top)
+    if output_format == "json":
+        return render_graph_report_json(report)
+    return render_graph_report(report)
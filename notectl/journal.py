@@ -0,0 +1,84 @@
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Optional, Set, Tuple
+
+JOURNAL_FILE_NAME = ".notectl-tidy-journal.jsonl"
+
+
+def fsync_directory(path: Path):
+    """
+    Renames are only durable once the containing directory is flushed.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_file(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class MoveJournal:
+    """
+    Append-only write-ahead log for `attachments tidy`.
+
+    The first entry holds the full plan. Every following entry is a
+    checkpoint listing the move or rewrite indices committed in a batch.
+    """
+
+    def __init__(self, folder: Path):
+        self.path = folder / JOURNAL_FILE_NAME
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _append(self, entry: dict):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def begin(self, plan: dict):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "plan", **plan}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        fsync_directory(self.path.parent)
+
+    def checkpoint(self, kind: str, indices: Iterable[int]):
+        indices = list(indices)
+        if len(indices) == 0:
+            return
+        self._append({"type": kind, "indices": indices})
+
+    def load(self) -> Tuple[Optional[dict], Set[int], Set[int]]:
+        """
+        Returns the plan and the committed move and rewrite indices.
+        A torn trailing entry (from a crash mid-write) is ignored.
+        """
+        plan = None
+        moved = set()
+        rewritten = set()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if entry["type"] == "plan":
+                    plan = entry
+                elif entry["type"] == "moved":
+                    moved.update(entry["indices"])
+                elif entry["type"] == "rewritten":
+                    rewritten.update(entry["indices"])
+        return plan, moved, rewritten
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
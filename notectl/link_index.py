@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from .autoindex import MarkdownFile, get_worker_pool, read_markdown_file
+from .config import get_vault_cache_dir
+from .metrics import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    title TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    has_autoindex INTEGER NOT NULL,
+    listing_filters TEXT
+);
+CREATE TABLE IF NOT EXISTS links (source TEXT NOT NULL, target TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS links_by_source ON links (source);
+CREATE INDEX IF NOT EXISTS links_by_target ON links (target);
+CREATE INDEX IF NOT EXISTS listings ON notes (title) WHERE listing_filters IS NOT NULL;
+"""
+
+
+def get_listing_filters(file: MarkdownFile) -> List[dict]:
+    """
+    Filters of the tag or date filtered "all" blocks, which list notes that
+    don't link to them.
+    """
+    return [
+        autoindex.filters
+        for autoindex in file.autoindexes or []
+        if autoindex.filters.get("mode") == "all"
+        and ("filterByTags" in autoindex.filters or "filterByDate" in autoindex.filters)
+    ]
+
+
+def get_note_signatures(root: Path) -> Dict[str, Tuple[int, int]]:
+    """
+    (mtime, size) of every note, skipping hidden files and folders like glob.
+    """
+    signatures = {}
+    folders = [os.path.abspath(root)]
+    while folders:
+        with os.scandir(folders.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir():
+                    folders.append(entry.path)
+                elif entry.name.endswith(".md") and entry.is_file():
+                    stat = entry.stat()
+                    signatures[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return signatures
+
+
+class LinkIndex:
+    """
+    Reverse link index of a vault, cached in SQLite so a rename looks up and
+    updates only the notes it touches.
+
+    Notes are checked by mtime and size on refresh, with or without git, and
+    only the changed ones are read again.
+    """
+
+    def __init__(self, vault_path: Path):
+        self.vault_path = vault_path
+        self.path = get_vault_cache_dir(vault_path) / "link-index.sqlite3"
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def get_path(self, title: str) -> Optional[str]:
+        row = self.connection.execute("SELECT path FROM notes WHERE title = ?", (title,)).fetchone()
+        return row[0] if row else None
+
+    def get_backlinks(self, title: str) -> Set[str]:
+        rows = self.connection.execute(
+            "SELECT source FROM links WHERE target = ? AND source != target", (title,)
+        )
+        return {source for (source,) in rows}
+
+    def has_autoindex(self, title: str) -> bool:
+        row = self.connection.execute(
+            "SELECT has_autoindex FROM notes WHERE title = ?", (title,)
+        ).fetchone()
+        return bool(row and row[0])
+
+    def get_listings(self) -> Iterator[Tuple[str, str, List[dict]]]:
+        rows = self.connection.execute(
+            "SELECT title, path, listing_filters FROM notes WHERE listing_filters IS NOT NULL"
+        )
+        for title, path, listing_filters in rows:
+            yield title, path, json.loads(listing_filters)
+
+    def set_note(self, file: MarkdownFile, signature: Tuple[int, int]):
+        self.remove_note(file.title)
+        listing_filters = get_listing_filters(file)
+        self.connection.execute(
+            "INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                file.title,
+                file.path,
+                *signature,
+                bool(file.autoindexes),
+                json.dumps(listing_filters) if listing_filters else None,
+            ),
+        )
+        self.connection.executemany(
+            "INSERT INTO links VALUES (?, ?)",
+            [(file.title, target) for target in set(file.links)],
+        )
+
+    def remove_note(self, title: str):
+        self.connection.execute("DELETE FROM notes WHERE title = ?", (title,))
+        self.connection.execute("DELETE FROM links WHERE source = ?", (title,))
+
+    def refresh(self) -> int:
+        """
+        Reads again the notes whose mtime or size changed, including new
+        ones, and drops deleted ones. Returns how many changed.
+        """
+        signatures = get_note_signatures(self.vault_path)
+        by_path = {
+            path: (title, (mtime_ns, size))
+            for title, path, mtime_ns, size in self.connection.execute(
+                "SELECT title, path, mtime_ns, size FROM notes"
+            )
+        }
+        changed = [
+            path
+            for path, signature in signatures.items()
+            if path not in by_path or by_path[path][1] != signature
+        ]
+        with self.connection:
+            for path, (title, _) in by_path.items():
+                if path not in signatures:
+                    self.remove_note(title)
+            for markdown_file, size in get_worker_pool().map(read_markdown_file, changed):
+                metrics.increment("files_scanned")
+                metrics.increment("bytes_read", size)
+                self.set_note(markdown_file, signatures[markdown_file.path])
+        return len(changed)
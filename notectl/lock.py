@@ -0,0 +1,172 @@
+import fcntl
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+import typer
+from rich import print
+from .config import get_vault_cache_dir
+
+# A lock older than this is considered abandoned, even if its PID was reused.
+LOCK_STALE_SECONDS = 6 * 60 * 60
+
+LOCK_POLL_SECONDS = 0.5
+
+
+def is_pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to someone else.
+        return True
+    return True
+
+
+class RunLock:
+    """
+    Vault-level lock file holding the PID, host and command of the current run.
+    """
+
+    def __init__(self, vault_path: Path):
+        self.cache_dir = get_vault_cache_dir(vault_path)
+        self.path = self.cache_dir / "run.lock"
+        self.guard_path = self.cache_dir / "run.lock.guard"
+
+    def read_holder(self) -> Optional[dict]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def is_stale(self, holder: Optional[dict]) -> bool:
+        if holder is None:
+            # Unreadable, so it can't be checked.
+            return True
+        if time.time() - holder["started_at"] > LOCK_STALE_SECONDS:
+            return True
+        if holder["host"] == socket.gethostname():
+            return not is_pid_alive(holder["pid"])
+        # PIDs on other hosts (e.g. a synced cache) can't be checked.
+        return False
+
+    @contextmanager
+    def guard(self):
+        """
+        Serializes checking, breaking and taking the lock between processes,
+        so two of them can't both decide the same stale lock is theirs.
+        """
+        with open(self.guard_path, "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def try_acquire(self, command: str) -> bool:
+        with self.guard():
+            if self.path.exists():
+                holder = self.read_holder()
+                if not self.is_stale(holder):
+                    return False
+                if holder is not None:
+                    print(f"[yellow]Removing stale lock left by PID {holder['pid']}.[/yellow]")
+            # Written aside and renamed in, so readers never see half a lock.
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(
+                    {
+                        "pid": os.getpid(),
+                        "host": socket.gethostname(),
+                        "command": command,
+                        "started_at": time.time(),
+                    },
+                    f,
+                )
+            os.replace(tmp_path, self.path)
+            return True
+
+    def acquire(self, command: str):
+        """
+        Blocks until the lock is free.
+        """
+        while not self.try_acquire(command):
+            time.sleep(LOCK_POLL_SECONDS)
+
+    def release(self):
+        with self.guard():
+            holder = self.read_holder()
+            if holder is not None and holder["pid"] == os.getpid():
+                self.path.unlink(missing_ok=True)
+
+    def get_follow_up_path(self, command: str) -> Path:
+        return self.cache_dir / f"follow-up-{command}"
+
+    def request_follow_up(self, command: str):
+        # One marker per command, however many triggers fire.
+        self.get_follow_up_path(command).touch()
+
+    def take_follow_up(self, command: str) -> bool:
+        try:
+            self.get_follow_up_path(command).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def run_exclusively(
+    vault_path: Path, command: str, run: Callable[[], None], coalesce: bool = True
+):
+    """
+    Runs `run` while holding the vault lock.
+
+    If the same command is already running, a single follow-up run is
+    requested from it instead. Other commands, and commands whose runs
+    differ by their arguments (coalesce=False), wait for the lock.
+    """
+    lock = RunLock(vault_path)
+    if not lock.try_acquire(command):
+        holder = lock.read_holder()
+        if coalesce and holder is not None and holder["command"] == command:
+            lock.request_follow_up(command)
+            # The holder may have finished between the two checks.
+            if not lock.try_acquire(command):
+                print(
+                    f"Another {command} run is in progress (PID {holder['pid']}). "
+                    "Queued a follow-up run."
+                )
+                return
+        else:
+            if holder is not None:
+                print(
+                    f"Waiting for {holder['command']} (PID {holder['pid']}) to finish..."
+                )
+            lock.acquire(command)
+
+    failure = None
+    while True:
+        # This run covers anything requested before it started.
+        lock.take_follow_up(command)
+        try:
+            run()
+            failure = None
+        except SystemExit as e:
+            # Commands often end with exit(); the run is still over, so a
+            # follow-up requested meanwhile must not be dropped.
+            failure = e if e.code not in (0, None) else None
+        except typer.Exit as e:
+            failure = e if e.exit_code != 0 else None
+        finally:
+            lock.release()
+        # Checked after releasing, so a request racing the release isn't lost.
+        if not lock.take_follow_up(command):
+            break
+        print(f"Running a follow-up {command} requested during the last run.")
+        lock.acquire(command)
+    if failure is not None:
+        raise failure
@@ -0,0 +1,375 @@
+import bisect
+import glob
+import json
+import os
+import re
+import sys
+from collections import Counter
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import quote, unquote, urlparse
+from .autoindex import MarkdownFile, get_title_from_path, get_worker_pool, parse_markdown_file
+from .graph import build_backlink_index
+
+# Most editors filter client-side, so a capped list is enough while typing.
+MAX_COMPLETION_ITEMS = 200
+
+COMPLETION_KIND_FILE = 17
+COMPLETION_KIND_KEYWORD = 14
+
+# An unclosed wikilink or a hashtag right before the cursor.
+OPEN_WIKILINK_PATTERN = re.compile(r"\[\[([^\[\]|]*)$")
+OPEN_HASHTAG_PATTERN = re.compile(r"(?:^|\W)#(\w*)$")
+# Methods that are valid before `initialize` has built the index.
+LIFECYCLE_METHODS = ("initialize", "initialized", "shutdown", "exit")
+
+WIKILINK_PATTERN = re.compile(r"\[\[([^|\]]+)(?:\|([^\]]+))?\]\]")
+
+# Character offsets count UTF-16 code units unless the client accepts code points.
+POSITION_ENCODINGS = ("utf-32", "utf-16")
+
+# Line, start and end character of each [[wikilink]], by target title.
+LinkRanges = Dict[str, List[Tuple[int, int, int]]]
+
+
+def uri_to_path(uri: str) -> str:
+    return os.path.abspath(unquote(urlparse(uri).path))
+
+
+def path_to_uri(path) -> str:
+    # Same as Path.as_uri() for absolute paths, without building a Path.
+    return "file://" + quote(os.fsencode(path))
+
+
+def to_code_point_index(line_text: str, character: int, position_encoding: str) -> int:
+    if position_encoding == "utf-32":
+        return character
+    units = 0
+    for idx, char in enumerate(line_text):
+        if units >= character:
+            return idx
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(line_text)
+
+
+def to_character(line_text: str, index: int, position_encoding: str) -> int:
+    if position_encoding == "utf-32":
+        return index
+    return index + sum(1 for char in line_text[:index] if ord(char) > 0xFFFF)
+
+
+def find_link_ranges(content: str, position_encoding: str) -> LinkRanges:
+    ranges = {}
+    for line_num, line in enumerate(content.split("\n")):
+        if "[[" not in line:
+            continue
+        for match in WIKILINK_PATTERN.finditer(line):
+            ranges.setdefault(match.group(1), []).append(
+                (
+                    line_num,
+                    to_character(line, match.start(), position_encoding),
+                    to_character(line, match.end(), position_encoding),
+                )
+            )
+    return ranges
+
+
+def read_note(path: str, position_encoding: str) -> Tuple[MarkdownFile, LinkRanges]:
+    with open(path, "r") as f:
+        content = f.read()
+    return parse_markdown_file(path, content), find_link_ranges(content, position_encoding)
+
+
+class VaultIndex:
+    """
+    Resident index of the vault: notes by title, backlinks, link ranges and
+    tag counts. Single notes are re-parsed on change instead of rescanning
+    the vault.
+    """
+
+    def __init__(self, root: Path, position_encoding: str = "utf-16"):
+        self.root = root
+        self.position_encoding = position_encoding
+        self.files: Dict[str, MarkdownFile] = {}
+        self.link_ranges: Dict[str, LinkRanges] = {}
+        self.uris: Dict[str, str] = {}
+        paths = [os.path.abspath(path) for path in glob.glob(f"{root}/**/*.md", recursive=True)]
+        read = partial(read_note, position_encoding=position_encoding)
+        for file, ranges in get_worker_pool().map(read, paths):
+            self.files[file.title] = file
+            self.link_ranges[file.title] = ranges
+            self.uris[file.title] = path_to_uri(file.path)
+        self.backlinks: Dict[str, Set[str]] = build_backlink_index(self.files)
+        self.tags = Counter(tag for file in self.files.values() for tag in set(file.tags))
+        self.sorted_titles = sorted((title.lower(), title) for title in self.files)
+        # Text of documents open in the editor, which may be ahead of disk.
+        self.open_documents: Dict[str, str] = {}
+
+    def update(self, path: str, content: str):
+        title = get_title_from_path(path)
+        old_file = self.files.get(title)
+        if old_file is not None:
+            for target in set(old_file.links):
+                self.backlinks.get(target, set()).discard(title)
+            self.tags.subtract(set(old_file.tags))
+        else:
+            bisect.insort(self.sorted_titles, (title.lower(), title))
+
+        new_file = parse_markdown_file(path, content)
+        self.files[title] = new_file
+        self.link_ranges[title] = find_link_ranges(content, self.position_encoding)
+        self.uris[title] = path_to_uri(path)
+        for target in new_file.links:
+            if target != title:
+                self.backlinks.setdefault(target, set()).add(title)
+        self.tags.update(set(new_file.tags))
+
+    def read(self, path: str) -> str:
+        if path in self.open_documents:
+            return self.open_documents[path]
+        with open(path, "r") as f:
+            return f.read()
+
+    def complete_titles(self, prefix: str) -> List[str]:
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.sorted_titles, (prefix,))
+        titles = []
+        for lowered, title in self.sorted_titles[start : start + MAX_COMPLETION_ITEMS]:
+            if not lowered.startswith(prefix):
+                break
+            titles.append(title)
+        return titles
+
+    def complete_tags(self, prefix: str) -> List[str]:
+        prefix = prefix.lower()
+        return [
+            tag
+            for tag, count in self.tags.most_common()
+            if count > 0 and tag.lower().startswith(prefix)
+        ][:MAX_COMPLETION_ITEMS]
+
+
+def get_line(text: str, line: int) -> str:
+    lines = text.split("\n")
+    return lines[line] if 0 <= line < len(lines) else ""
+
+
+def get_wikilink_at(line_text: str, character: int) -> Optional[str]:
+    for match in WIKILINK_PATTERN.finditer(line_text):
+        if match.start() <= character <= match.end():
+            return match.group(1)
+    return None
+
+
+def find_link_locations(index: VaultIndex, source_title: str, target_title: str) -> List[dict]:
+    uri = index.uris[source_title]
+    return [
+        {
+            "uri": uri,
+            "range": {
+                "start": {"line": line_num, "character": start},
+                "end": {"line": line_num, "character": end},
+            },
+        }
+        for line_num, start, end in index.link_ranges.get(source_title, {}).get(target_title, [])
+    ]
+
+
+class LanguageServer:
+    def __init__(self, vault_root: Path, stdin=None, stdout=None):
+        self.vault_root = vault_root
+        self.stdin = stdin or sys.stdin.buffer
+        self.stdout = stdout or sys.stdout.buffer
+        self.index: Optional[VaultIndex] = None
+        self.position_encoding = "utf-16"
+        self.running = True
+
+    def read_message(self) -> Optional[dict]:
+        content_length = None
+        while True:
+            header = self.stdin.readline()
+            if not header:
+                return None
+            header = header.decode("ascii").strip()
+            if header == "":
+                break
+            name, _, value = header.partition(":")
+            if name.lower() == "content-length":
+                content_length = int(value.strip())
+        if content_length is None:
+            return None
+        return json.loads(self.stdin.read(content_length))
+
+    def send(self, message: dict):
+        body = json.dumps({"jsonrpc": "2.0", **message}).encode("utf-8")
+        self.stdout.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+        self.stdout.flush()
+
+    def serve(self):
+        while self.running:
+            message = self.read_message()
+            if message is None:
+                break
+            method = message.get("method")
+            handler = getattr(self, "on_" + (method or "").replace("/", "_").replace("$", ""), None)
+            initialized = self.index is not None or method in LIFECYCLE_METHODS
+            if "id" not in message:
+                # Notification, no response expected, so errors only get logged.
+                if handler is not None and initialized:
+                    try:
+                        handler(message.get("params") or {})
+                    except Exception as e:
+                        self.log(f"Error handling {method}: {e!r}")
+                continue
+            if not initialized:
+                self.send(
+                    {
+                        "id": message["id"],
+                        "error": {"code": -32002, "message": "Server not initialized"},
+                    }
+                )
+                continue
+            if handler is None:
+                self.send(
+                    {
+                        "id": message["id"],
+                        "error": {"code": -32601, "message": f"Method not found: {method}"},
+                    }
+                )
+                continue
+            try:
+                result = handler(message.get("params") or {})
+                self.send({"id": message["id"], "result": result})
+            except Exception as e:
+                self.log(f"Error handling {method}: {e!r}")
+                self.send({"id": message["id"], "error": {"code": -32603, "message": str(e)}})
+
+    def log(self, message: str):
+        # stdout carries the protocol, so diagnostics go to stderr.
+        print(f"notectl lsp: {message}", file=sys.stderr, flush=True)
+
+    def is_note(self, path: str) -> bool:
+        # Notes that were never saved have no timestamps to index yet.
+        return (
+            path.endswith(".md")
+            and Path(path).is_relative_to(self.vault_root)
+            and os.path.isfile(path)
+        )
+
+    def get_line_before(self, path: str, position: dict) -> str:
+        line_text = get_line(self.index.read(path), position["line"])
+        return line_text[
+            : to_code_point_index(line_text, position["character"], self.position_encoding)
+        ]
+
+    def get_wikilink_at_position(self, path: str, position: dict) -> Optional[str]:
+        line_text = get_line(self.index.read(path), position["line"])
+        character = to_code_point_index(line_text, position["character"], self.position_encoding)
+        return get_wikilink_at(line_text, character)
+
+    def on_initialize(self, params):
+        offered = params.get("capabilities", {}).get("general", {}).get("positionEncodings", [])
+        self.position_encoding = next(
+            (encoding for encoding in POSITION_ENCODINGS if encoding in offered), "utf-16"
+        )
+        self.index = VaultIndex(self.vault_root, self.position_encoding)
+        return {
+            "capabilities": {
+                "positionEncoding": self.position_encoding,
+                # Full document sync; the index itself is updated per note.
+                "textDocumentSync": {"openClose": True, "change": 1, "save": {"includeText": True}},
+                "completionProvider": {"triggerCharacters": ["[", "#"]},
+                "definitionProvider": True,
+                "referencesProvider": True,
+            },
+            "serverInfo": {"name": "notectl"},
+        }
+
+    def on_initialized(self, params):
+        pass
+
+    def on_shutdown(self, params):
+        return None
+
+    def on_exit(self, params):
+        self.running = False
+
+    def on_textDocument_didOpen(self, params):
+        document = params["textDocument"]
+        path = uri_to_path(document["uri"])
+        if self.is_note(path):
+            self.index.open_documents[path] = document["text"]
+            if get_title_from_path(path) not in self.index.files:
+                self.index.update(path, document["text"])
+
+    def on_textDocument_didChange(self, params):
+        path = uri_to_path(params["textDocument"]["uri"])
+        changes = params.get("contentChanges") or []
+        if not self.is_note(path) or len(changes) == 0:
+            return
+        text = changes[-1]["text"]
+        self.index.open_documents[path] = text
+        self.index.update(path, text)
+
+    def on_textDocument_didSave(self, params):
+        path = uri_to_path(params["textDocument"]["uri"])
+        if not self.is_note(path):
+            return
+        text = params.get("text")
+        if text is None:
+            with open(path, "r") as f:
+                text = f.read()
+        self.index.update(path, text)
+
+    def on_textDocument_didClose(self, params):
+        self.index.open_documents.pop(uri_to_path(params["textDocument"]["uri"]), None)
+
+    def on_textDocument_completion(self, params):
+        path = uri_to_path(params["textDocument"]["uri"])
+        line_text = self.get_line_before(path, params["position"])
+
+        wikilink = OPEN_WIKILINK_PATTERN.search(line_text)
+        if wikilink:
+            titles = self.index.complete_titles(wikilink.group(1))
+            return {
+                "isIncomplete": len(titles) == MAX_COMPLETION_ITEMS,
+                "items": [{"label": title, "kind": COMPLETION_KIND_FILE} for title in titles],
+            }
+        hashtag = OPEN_HASHTAG_PATTERN.search(line_text)
+        if hashtag:
+            tags = self.index.complete_tags(hashtag.group(1))
+            return {
+                "isIncomplete": len(tags) == MAX_COMPLETION_ITEMS,
+                "items": [{"label": tag, "kind": COMPLETION_KIND_KEYWORD} for tag in tags],
+            }
+        return {"isIncomplete": False, "items": []}
+
+    def on_textDocument_definition(self, params):
+        path = uri_to_path(params["textDocument"]["uri"])
+        title = self.get_wikilink_at_position(path, params["position"])
+        if title is None or title not in self.index.files:
+            return None
+        return {
+            "uri": path_to_uri(self.index.files[title].path),
+            "range": {
+                "start": {"line": 0, "character": 0},
+                "end": {"line": 0, "character": 0},
+            },
+        }
+
+    def on_textDocument_references(self, params):
+        path = uri_to_path(params["textDocument"]["uri"])
+        # References of the link under the cursor, or of the note itself.
+        title = self.get_wikilink_at_position(path, params["position"])
+        if title is None:
+            title = get_title_from_path(path)
+        locations = []
+        for source_title in sorted(self.index.backlinks.get(title, set())):
+            if source_title in self.index.files:
+                locations.extend(find_link_locations(self.index, source_title, title))
+        return locations
+
+
+def run_language_server(vault_root: Path):
+    LanguageServer(vault_root).serve()
@@ -2,7 +2,7 @@ import typer
 
 from .topic_notes import create_topic_file
 from .daily_notes import create_daily_file
-from .attachments import run_collector
+from .attachments import run_collector, run_garbage_collector
 from .editor import open_in_editor
 from .config import (
     get_config_file,
@@ -10,12 +10,27 @@ from .config import (
     does_config_exist,
     get_config_value,
     get_vault_folder_path,
-    get_vault_path
+    get_vault_path,
+    get_selected_vaults,
+    select_vaults,
+    using_vault,
 )
 from rich import print
 from rich.prompt import Confirm
+from rich.table import Table
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import Callable, Optional
 from typing_extensions import Annotated
 from .autoindex import run_autoindex
+from .graph import run_graph_report
+from .lsp import run_language_server
+from .metrics import metrics
+from .lock import run_exclusively
+from .rename import run_rename
+
+METRICS_FILE_HELP = "Write run metrics to this file: JSON for *.json, Prometheus text format otherwise."
 
 app = typer.Typer()
 config_app = typer.Typer()
@@ -28,10 +43,77 @@ attachments_app = typer.Typer()
 app.add_typer(attachments_app, name="attachments")
 autoindex_app = typer.Typer()
 app.add_typer(autoindex_app, name="autoindex")
+graph_app = typer.Typer()
+app.add_typer(graph_app, name="graph")
+
+
+@contextmanager
+def recording_metrics(command: str, metrics_file: Optional[Path], vault: Optional[str] = None):
+    """
+    Writes the run metrics on the way out, even when the run exits early.
+    """
+    metrics.start(command, vault=vault)
+    try:
+        yield
+    finally:
+        if metrics_file is not None:
+            metrics.write(metrics_file)
+
+
+def run_for_each_vault(command: str, run: Callable[[], None], metrics_file: Optional[Path]):
+    """
+    Runs a command once per selected vault in this process and reports per vault.
+    """
+    vaults = get_selected_vaults()
+    if len(vaults) == 1:
+        with recording_metrics(command, metrics_file, vault=vaults[0]):
+            run()
+        return
+
+    table = Table("Vault", "Status", "Seconds", "Files written", "Attachments moved")
+    failed = False
+    for name in vaults:
+        print(f"[bold cyan]{name}[/bold cyan]")
+        status = "ok"
+        vault_metrics_file = (
+            metrics_file.with_name(f"{metrics_file.stem}-{name}{metrics_file.suffix}")
+            if metrics_file is not None
+            else None
+        )
+        with using_vault(name):
+            try:
+                with recording_metrics(command, vault_metrics_file, vault=name):
+                    run()
+            except SystemExit as e:
+                # Early exits like "No attachments to relocate." aren't failures.
+                if e.code not in (0, None):
+                    status = "failed"
+            except typer.Exit as e:
+                if e.exit_code != 0:
+                    status = "failed"
+            except Exception as e:
+                status = f"error: {e}"
+        failed = failed or status != "ok"
+        table.add_row(
+            name,
+            status,
+            f"{metrics.to_dict()['wall_seconds']:.2f}",
+            str(metrics.counters["files_written"]),
+            str(metrics.counters["attachments_moved"]),
+        )
+    print(table)
+    if failed:
+        raise typer.Exit(code=1)
 
 
 @app.callback(invoke_without_command=True)
-def callback(ctx: typer.Context):
+def callback(
+    ctx: typer.Context,
+    vault: Annotated[
+        Optional[str],
+        typer.Option(help='The vault profile to use from [vaults.NAME], or "all" (autoindex run, attachments tidy).'),
+    ] = None,
+):
     """
     A simple note management tool.
     """
@@ -41,6 +123,8 @@ def callback(ctx: typer.Context):
             "No configuration found. Please run [bold cyan]notectl config init[/bold cyan]."
         )
         raise typer.Exit(code=1)
+    if vault is not None:
+        select_vaults(vault)
 
 
 @config_app.callback()
@@ -80,6 +164,13 @@ def autoindex_callback():
     """
     pass
 
+@graph_app.callback()
+def graph_callback():
+    """
+    Inspects the link graph of the vault.
+    """
+    pass
+
 @config_app.command("init")
 def config_init(
     preset_file: Annotated[
@@ -188,25 +279,120 @@ def topics_new(
 
 @attachments_app.command("tidy")
 def attachments_tidy(
-    dry_run: Annotated[bool, "Whether to perform a dry run."] = False
+    dry_run: Annotated[bool, "Whether to perform a dry run."] = False,
+    resume: Annotated[bool, typer.Option(help="Resume an interrupted tidy from its journal.")] = False,
+    rollback: Annotated[bool, typer.Option(help="Undo an interrupted tidy from its journal.")] = False,
+    metrics_file: Annotated[Optional[Path], typer.Option(help=METRICS_FILE_HELP)] = None,
 ):
     """
     Collects all attachments and moves them to the attachments folder.
+
+    Planned moves and rewrites are journaled first, so an interrupted run can be resumed or rolled back.
+    """
+    if resume and rollback:
+        print("[bold red]Error:[/bold red] --resume and --rollback are mutually exclusive.")
+        raise typer.Exit(code=1)
+
+    def tidy():
+        vault_root = get_vault_path()
+        folders_to_tidy = get_config_value("attachments", "folders_to_tidy", assert_value=True)
+        resolved_paths = [(vault_root / folder).resolve(strict=True) for folder in folders_to_tidy]
+        attachments_folder = get_vault_folder_path("attachments_folder")
+        run = partial(
+            run_collector,
+            attachments_folder,
+            resolved_paths,
+            dry_run=dry_run,
+            resume=resume,
+            rollback=rollback,
+        )
+        if dry_run:
+            run()
+        else:
+            # A plain tidy can be coalesced; a resume or rollback must run itself.
+            run_exclusively(
+                vault_root, "attachments_tidy", run, coalesce=not (resume or rollback)
+            )
+
+    run_for_each_vault("attachments_tidy", tidy, metrics_file)
+
+@attachments_app.command("gc")
+def attachments_gc(
+    quarantine: Annotated[bool, typer.Option(help="Move unreferenced attachments into a .quarantine folder.")] = False
+):
+    """
+    Reports attachments that are no longer referenced by any note.
     """
     vault_root = get_vault_path()
-    folders_to_tidy = get_config_value("attachments", "folders_to_tidy", assert_value=True)
-    resolved_paths = [(vault_root / folder).resolve(strict=True) for folder in folders_to_tidy]
     attachments_folder = get_vault_folder_path("attachments_folder")
-    run_collector(attachments_folder, resolved_paths, dry_run=dry_run)
+    run = partial(run_garbage_collector, vault_root, attachments_folder, quarantine=quarantine)
+    if quarantine:
+        run_exclusively(vault_root, "attachments_gc", run)
+    else:
+        run()
 
 @autoindex_app.command("run")
-def autoindex_run():
+def autoindex_run(
+    changed_since: Annotated[
+        Optional[str],
+        typer.Option(
+            help='Only re-parse notes git reports as changed since this revision. Use "snapshot" for the last snapshot commit.'
+        ),
+    ] = None,
+    metrics_file: Annotated[Optional[Path], typer.Option(help=METRICS_FILE_HELP)] = None,
+):
     """
     Runs the autoindexer.
     """
+    def autoindex():
+        vault_root = get_vault_path()
+        run_exclusively(
+            vault_root,
+            "autoindex_run",
+            partial(run_autoindex, input_path=vault_root, changed_since=changed_since),
+        )
+
+    run_for_each_vault("autoindex_run", autoindex, metrics_file)
+
+@app.command("rename")
+def rename(
+    old_title: str,
+    new_title: str,
+    dry_run: Annotated[bool, "Whether to perform a dry run."] = False,
+):
+    """
+    Renames a note and rewrites every [[wikilink]] pointing at it, aliases included.
+    """
     vault_root = get_vault_path()
-    run_autoindex(input_path=vault_root)
-    
+    run = partial(run_rename, vault_root, old_title, new_title, dry_run=dry_run)
+    if dry_run:
+        run()
+    else:
+        # Each rename has its own arguments, so it waits instead of coalescing.
+        run_exclusively(vault_root, "rename", run, coalesce=False)
+
+@app.command("lsp")
+def lsp():
+    """
+    Runs a Language Server over stdio for wikilink completion, go-to-definition and backlinks.
+    """
+    vault_root = get_vault_path()
+    run_language_server(vault_root)
+
+@graph_app.command("report")
+def graph_report(
+    top: Annotated[int, typer.Option(help="How many hubs to list.")] = 10,
+    output_format: Annotated[str, typer.Option("--format", help="Output format: text or json.")] = "text",
+):
+    """
+    Reports orphaned notes, dead wikilinks and the most linked hubs.
+    """
+    if output_format not in ("text", "json"):
+        print(f"[bold red]Error:[/bold red] Unknown format: {output_format}")
+        raise typer.Exit(code=1)
+    vault_root = get_vault_path()
+    typer.echo(run_graph_report(vault_root, top=top, output_format=output_format))
+
 
 if __name__ == "__main__":
     app()
@@ -0,0 +1,111 @@
+import json
+import resource
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+
+# Always exported, even when zero, so alerts don't see series disappear.
+COUNTER_NAMES = (
+    "files_scanned",
+    "bytes_read",
+    "blocks_evaluated",
+    "files_written",
+    "attachments_moved",
+)
+
+
+class RunMetrics:
+    """
+    Collects wall time per phase and counters for a single command run.
+    """
+
+    def __init__(self):
+        self.command = None
+        self.vault = None
+        self.started_at = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.counters = Counter()
+
+    def start(self, command: str, vault: Optional[str] = None):
+        self.command = command
+        self.vault = vault
+        self.started_at = time.perf_counter()
+        self.phases.clear()
+        self.counters = Counter({name: 0 for name in COUNTER_NAMES})
+
+    @contextmanager
+    def phase(self, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started_at
+
+    def increment(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+
+    def get_peak_rss_bytes(self) -> int:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes.
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    def to_dict(self) -> dict:
+        return {
+            "command": self.command,
+            "vault": self.vault,
+            "timestamp": int(time.time()),
+            "wall_seconds": time.perf_counter() - self.started_at,
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+            "peak_rss_bytes": self.get_peak_rss_bytes(),
+        }
+
+    def to_prometheus(self) -> str:
+        data = self.to_dict()
+        command = f'command="{data["command"]}"'
+        if data["vault"] is not None:
+            command += f',vault="{data["vault"]}"'
+        lines = [
+            "# HELP notectl_run_seconds Wall time of the whole run.",
+            "# TYPE notectl_run_seconds gauge",
+            f"notectl_run_seconds{{{command}}} {data['wall_seconds']:.6f}",
+            "# HELP notectl_phase_seconds Wall time per phase of the run.",
+            "# TYPE notectl_phase_seconds gauge",
+        ]
+        for phase, seconds in data["phases"].items():
+            lines.append(f'notectl_phase_seconds{{{command},phase="{phase}"}} {seconds:.6f}')
+        for name, value in sorted(data["counters"].items()):
+            lines.append(f"# TYPE notectl_{name} gauge")
+            lines.append(f"notectl_{name}{{{command}}} {value}")
+        lines.extend(
+            [
+                "# HELP notectl_peak_rss_bytes Peak resident set size of the process.",
+                "# TYPE notectl_peak_rss_bytes gauge",
+                f"notectl_peak_rss_bytes{{{command}}} {data['peak_rss_bytes']}",
+                "# TYPE notectl_last_run_timestamp_seconds gauge",
+                f"notectl_last_run_timestamp_seconds{{{command}}} {data['timestamp']}",
+            ]
+        )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path):
+        """
+        Writes JSON for *.json files and the Prometheus text format otherwise.
+        """
+        content = (
+            json.dumps(self.to_dict(), indent=2)
+            if path.suffix == ".json"
+            else self.to_prometheus()
+        )
+        # Write atomically so a scraper never reads half a file.
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_text(content)
+        tmp_path.replace(path)
+
+
+# Shared by whichever command is running; written out only on --metrics-file.
+metrics = RunMetrics()
@@ -0,0 +1,109 @@
+import os
+import re
+from pathlib import Path
+from typing import Set
+from rich import print
+from .autoindex import (
+    AutoindexConfig,
+    MarkdownFile,
+    get_links_by_autoindex_config,
+    parse_markdown_file,
+)
+from .git import take_git_snapshot as take_snapshot
+from .link_index import LinkIndex
+
+
+def get_wikilink_pattern(title: str) -> re.Pattern:
+    # Matches [[Title]] and [[Title|alias]], keeping the alias.
+    return re.compile(r"\[\[" + re.escape(title) + r"(\|[^\]]+)?\]\]")
+
+
+def rewrite_wikilinks(content: str, old_title: str, new_title: str) -> str:
+    return get_wikilink_pattern(old_title).sub(
+        lambda match: "[[" + new_title + (match.group(1) or "") + "]]", content
+    )
+
+
+def get_listing_titles(links: LinkIndex, old_file: MarkdownFile) -> Set[str]:
+    """
+    Notes whose autoindex blocks may list the renamed note: the ones it links
+    to, and the tag or date filtered lists it matches.
+    """
+    titles = {title for title in set(old_file.links) if links.has_autoindex(title)}
+    for title, path, listing_filters in links.get_listings():
+        listing_file = MarkdownFile(path, title, [])
+        for filters in listing_filters:
+            if get_links_by_autoindex_config(
+                listing_file, {old_file.title: old_file}, AutoindexConfig("", filters)
+            ):
+                titles.add(title)
+    return titles
+
+
+def run_rename(input_path: Path, old_title: str, new_title: str, dry_run=False):
+    links = LinkIndex(input_path)
+    try:
+        links.refresh()
+        rename_note(links, old_title, new_title, dry_run=dry_run)
+    finally:
+        links.close()
+
+
+def rename_note(links: LinkIndex, old_title: str, new_title: str, dry_run=False):
+    old_path = links.get_path(old_title)
+    if old_path is None:
+        print(f"[bold red]Error:[/bold red] No note titled {old_title}.")
+        exit(1)
+    if links.get_path(new_title) is not None:
+        print(f"[bold red]Error:[/bold red] A note titled {new_title} already exists.")
+        exit(1)
+    if "/" in new_title or new_title.strip() == "":
+        print(f"[bold red]Error:[/bold red] Invalid title: {new_title}")
+        exit(1)
+
+    new_path = os.path.join(os.path.dirname(old_path), f"{new_title}.md")
+    if os.path.exists(new_path):
+        print(f"[bold red]Error:[/bold red] {new_path} already exists.")
+        exit(1)
+    with open(old_path, "r") as f:
+        old_file = parse_markdown_file(old_path, f.read())
+
+    # The notes that link here, the lists that show this note, and the note itself.
+    titles = (links.get_backlinks(old_title) | get_listing_titles(links, old_file)) - {old_title}
+    affected = [path for path in map(links.get_path, sorted(titles)) if path is not None]
+    affected.append(old_path)
+
+    print(f"Renaming {old_title} -> {new_title}, updating {len(affected) - 1} other notes")
+    if dry_run:
+        for path in affected:
+            print(f"[green]Would update {path}[/green]")
+        return
+
+    # Take a snapshot of the directory
+    take_snapshot()
+
+    with links.connection:
+        links.remove_note(old_title)
+        for path in affected:
+            with open(path, "r") as f:
+                content = f.read()
+            if path == old_path:
+                os.rename(old_path, new_path)
+                path = new_path
+            # Listed entries are renamed in place; the next autoindex run
+            # re-sorts them, since these notes changed since its state.
+            new_content = rewrite_wikilinks(content, old_title, new_title)
+            if new_content != content:
+                # One write per affected note.
+                with open(path, "w") as f:
+                    f.write(new_content)
+                print(f"Updated {path}")
+            stat = os.stat(path)
+            links.set_note(
+                parse_markdown_file(path, new_content), (stat.st_mtime_ns, stat.st_size)
+            )
+
+    # The cached autoindex state is left alone: its commit still marks the
+    # last autoindex run, so the next incremental run picks these edits up
+    # along with anything else changed since.
+    print(f"[bold green]Renamed {old_path} to {new_path}[/bold green]")
@@ -0,0 +1,108 @@
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from notectl import attachments, autoindex, config, rename
+from notectl.lock import RunLock
+
+
+class GitVault:
+    """
+    A vault in a git repository, whose snapshots commit everything like the
+    real snapshot script.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def git(self, *args):
+        subprocess.run(
+            ["git", "-c", "user.name=notectl", "-c", "user.email=notectl@localhost", *args],
+            cwd=self.path,
+            check=True,
+            capture_output=True,
+        )
+
+    def snapshot(self):
+        self.git("add", "-A")
+        self.git("commit", "--allow-empty", "-m", "[snapshot] test")
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """
+    Keeps locks and autoindex state out of the real user cache.
+    """
+    path = tmp_path / "cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(path))
+    return path
+
+
+@pytest.fixture
+def git_vault(tmp_path, monkeypatch) -> GitVault:
+    vault = GitVault(tmp_path / "vault")
+    vault.path.mkdir()
+    vault.git("init", "-q")
+    for module in (attachments, autoindex, rename):
+        monkeypatch.setattr(module, "take_snapshot", vault.snapshot)
+    return vault
+
+
+@pytest.fixture
+def write_config(tmp_path, monkeypatch):
+    """
+    Points notectl at a config file in the test's directory.
+    """
+    config_dir = tmp_path / "config"
+    config_dir.mkdir()
+    monkeypatch.setattr(config, "CONFIG_DIR", str(config_dir))
+
+    def write(content: str):
+        (config_dir / config.CONFIG_FILE_NAME).write_text(content)
+
+    return write
+
+
+@pytest.fixture
+def hold_lock():
+    """
+    Makes a sleeping process the holder of a vault's lock. It's killed after
+    `finish_after` seconds if given, and on teardown otherwise.
+    """
+    processes = []
+    timers = []
+
+    def finish(process: subprocess.Popen):
+        process.kill()
+        # Reaped, or the zombie would still look alive to the lock.
+        process.wait()
+
+    def hold(vault_path, command: str, finish_after: float = None) -> subprocess.Popen:
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        processes.append(process)
+        if finish_after is not None:
+            timers.append(threading.Timer(finish_after, finish, [process]))
+            timers[-1].start()
+        RunLock(vault_path).path.write_text(
+            json.dumps(
+                {
+                    "pid": process.pid,
+                    "host": socket.gethostname(),
+                    "command": command,
+                    "started_at": time.time(),
+                }
+            )
+        )
+        return process
+
+    yield hold
+    for timer in timers:
+        timer.cancel()
+    for process in processes:
+        finish(process)
@@ -0,0 +1,234 @@
+import errno
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from notectl import attachments
+from notectl.attachments import (
+    PlannedMove,
+    PlannedRewrite,
+    rewrite_attachment_references,
+    run_collector,
+)
+from notectl.journal import MoveJournal
+from notectl.main import app
+
+
+def make_vault(tmp_path: Path):
+    notes = tmp_path / "notes"
+    (notes / "sub" / "att").mkdir(parents=True)
+    (notes / "att").mkdir()
+    (notes / "sub" / "att" / "q.png").write_bytes(b"png")
+    note = notes / "n.md"
+    note.write_text("![](sub/att/q.png)\n")
+    return notes, note
+
+
+def test_rewrite_when_new_path_is_substring_of_old(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "take_snapshot", lambda: None)
+    notes, note = make_vault(tmp_path)
+
+    run_collector(notes / "att", [notes])
+
+    assert (notes / "att" / "q.png").is_file()
+    assert note.read_text() == "![](att/q.png)\n"
+    assert not MoveJournal(notes / "att").exists()
+
+
+def test_rewrite_is_idempotent_on_resume(tmp_path):
+    note = tmp_path / "n.md"
+    note.write_text("![](sub/att/q.png)\n")
+    rewrite = PlannedRewrite(note, 1, "sub/att/q.png", "att/q.png", 0)
+
+    rewrite_attachment_references(note, [rewrite])
+    rewrite_attachment_references(note, [rewrite])
+
+    assert note.read_text() == "![](att/q.png)\n"
+
+
+def test_rollback_restores_moves_and_references(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "take_snapshot", lambda: None)
+    notes, note = make_vault(tmp_path)
+
+    def interrupt(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(attachments, "stage_attachment_references", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        run_collector(notes / "att", [notes])
+    monkeypatch.undo()
+    assert MoveJournal(notes / "att").exists()
+
+    run_collector(notes / "att", [notes], rollback=True)
+
+    assert (notes / "sub" / "att" / "q.png").is_file()
+    assert not (notes / "att" / "q.png").exists()
+    assert note.read_text() == "![](sub/att/q.png)\n"
+    assert not MoveJournal(notes / "att").exists()
+
+
+def make_gc_vault(tmp_path: Path):
+    vault = tmp_path / "vault"
+    att = vault / "attachments"
+    (vault / "notes").mkdir(parents=True)
+    att.mkdir()
+    for name in ["My Image.png", "bracket one.png", "old.png", "unused.png"]:
+        (att / name).write_bytes(b"x")
+    (vault / "notes" / "n.md").write_text(
+        "![](../attachments/My%20Image.png)\n"
+        "![](<../attachments/bracket one.png>)\n"
+        "![[old.png|300]]\n"
+    )
+    return vault, att
+
+
+def test_gc_marks_encoded_bracketed_and_embedded_references(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "take_snapshot", lambda: None)
+    vault, att = make_gc_vault(tmp_path)
+
+    attachments.run_garbage_collector(vault, att, quarantine=True)
+
+    assert sorted(p.name for p in att.iterdir() if p.is_file()) == [
+        "My Image.png",
+        "bracket one.png",
+        "old.png",
+    ]
+    assert (att / ".quarantine" / "unused.png").is_file()
+
+
+def test_gc_refuses_to_quarantine_with_unresolved_references(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "take_snapshot", lambda: None)
+    vault, att = make_gc_vault(tmp_path)
+    (vault / "notes" / "broken.md").write_text("![](../attachments/missing.png)\n")
+
+    with pytest.raises(SystemExit) as exit_info:
+        attachments.run_garbage_collector(vault, att, quarantine=True)
+
+    assert exit_info.value.code == 1
+
+    assert (att / "unused.png").is_file()
+
+
+def test_gc_marks_wikilinks_nested_parentheses_and_html(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "take_snapshot", lambda: None)
+    vault = tmp_path / "vault"
+    att = vault / "attachments"
+    (vault / "notes").mkdir(parents=True)
+    att.mkdir()
+    for name in ["report.pdf", "Screenshot (1).png", "html.png", "unused.png"]:
+        (att / name).write_bytes(b"x")
+    (att / "Note in attachments.md").write_text("Not an attachment.\n")
+    (vault / "notes" / "n.md").write_text(
+        "See [[report.pdf]].\n"
+        "![](../attachments/Screenshot%20(1).png)\n"
+        '<img src="../attachments/html.png">\n'
+    )
+
+    attachments.run_garbage_collector(vault, att, quarantine=True)
+
+    assert sorted(p.name for p in att.iterdir() if p.is_file()) == [
+        "Note in attachments.md",
+        "Screenshot (1).png",
+        "html.png",
+        "report.pdf",
+    ]
+    assert (att / ".quarantine" / "unused.png").is_file()
+
+
+def test_gc_refuses_to_quarantine_with_unresolved_suffixless_references(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "take_snapshot", lambda: None)
+    vault, att = make_gc_vault(tmp_path)
+    (vault / "notes" / "broken.md").write_text("![](../attachments/missing\n")
+
+    with pytest.raises(SystemExit):
+        attachments.run_garbage_collector(vault, att, quarantine=True)
+
+    assert (att / "unused.png").is_file()
+
+
+def test_interrupted_rewrite_leaves_notes_whole(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "take_snapshot", lambda: None)
+    notes, note = make_vault(tmp_path)
+
+    def interrupt(path):
+        raise KeyboardInterrupt
+
+    # The crash hits after the new contents are staged, before they're flushed.
+    monkeypatch.setattr(attachments, "fsync_file", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        run_collector(notes / "att", [notes])
+    monkeypatch.undo()
+
+    assert note.read_text() == "![](sub/att/q.png)\n"
+
+    run_collector(notes / "att", [notes], resume=True)
+
+    assert note.read_text() == "![](att/q.png)\n"
+    assert not (notes / ".n.md.tidy-tmp").exists()
+    assert not MoveJournal(notes / "att").exists()
+
+
+def test_rollback_waits_for_a_running_tidy_instead_of_being_coalesced(
+    tmp_path, monkeypatch, write_config, hold_lock
+):
+    monkeypatch.setattr(attachments, "take_snapshot", lambda: None)
+    notes, note = make_vault(tmp_path)
+    write_config(
+        f'[paths]\nroot = "{tmp_path}"\nattachments_folder = "notes/att"\n'
+        '[attachments]\nfolders_to_tidy = ["notes"]\n'
+    )
+
+    def interrupt(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    stage = attachments.stage_attachment_references
+    monkeypatch.setattr(attachments, "stage_attachment_references", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        run_collector(notes / "att", [notes])
+    monkeypatch.setattr(attachments, "stage_attachment_references", stage)
+
+    # A plain tidy is still running, and finishes a moment later.
+    hold_lock(tmp_path, "attachments_tidy", finish_after=0.2)
+    result = CliRunner().invoke(app, ["attachments", "tidy", "--rollback"])
+
+    assert result.exit_code == 0, result.output
+    assert "Rolled back" in result.output
+    assert (notes / "sub" / "att" / "q.png").is_file()
+    assert not MoveJournal(notes / "att").exists()
+
+
+def raise_exdev(self, target):
+    raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+
+def test_move_falls_back_to_copy_across_devices(tmp_path, monkeypatch):
+    source = tmp_path / "q.png"
+    source.write_bytes(b"png" * 1000)
+    destination = tmp_path / "att" / "q.png"
+    destination.parent.mkdir()
+    monkeypatch.setattr(Path, "rename", raise_exdev)
+
+    assert attachments.move_to_attachments_folder(PlannedMove(source, destination))
+
+    assert destination.read_bytes() == b"png" * 1000
+    assert not source.exists()
+    assert not (destination.parent / ".q.png.partial").exists()
+
+
+def test_failed_copy_across_devices_removes_the_partial_file(tmp_path, monkeypatch):
+    source = tmp_path / "q.png"
+    source.write_bytes(b"png" * 1000)
+    destination = tmp_path / "att" / "q.png"
+    destination.parent.mkdir()
+    monkeypatch.setattr(Path, "rename", raise_exdev)
+
+    def no_space(*args):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(attachments, "copy_file_contents", no_space)
+
+    assert not attachments.move_to_attachments_folder(PlannedMove(source, destination))
+
+    assert source.read_bytes() == b"png" * 1000
+    assert list(destination.parent.iterdir()) == []
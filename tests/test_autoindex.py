@@ -0,0 +1,93 @@
+import datetime
+from pathlib import Path
+
+import pytest
+
+from notectl import autoindex
+from notectl.autoindex import (
+    SORT_KEYS,
+    AutoindexConfig,
+    MarkdownFile,
+    get_selection_from_autoindex,
+    render_backlinks_to_markdown_list,
+    run_autoindex,
+    select_backlinks,
+)
+
+
+def make_vault(git_vault) -> Path:
+    vault = git_vault.path
+    (vault / "Hub.md").write_text("# Hub\n<autoindex>\n</autoindex>\n")
+    (vault / "Other.md").write_text("# Other\n<autoindex>\n</autoindex>\n")
+    (vault / "A.md").write_text("Part of [[Hub]].\n")
+    (vault / "B.md").write_text("Part of [[Other]].\n")
+    run_autoindex(vault)
+    return vault
+
+
+def test_changed_since_drops_removed_links(git_vault):
+    vault = make_vault(git_vault)
+    assert "- [[A]]\n" in (vault / "Hub.md").read_text()
+
+    # Only the old version of A links to Hub, so Hub depends on the state.
+    (vault / "A.md").write_text("No longer linked.\n")
+    run_autoindex(vault, changed_since="snapshot")
+
+    assert "[[A]]" not in (vault / "Hub.md").read_text()
+
+
+def test_changed_since_leaves_unrelated_blocks_alone(git_vault, monkeypatch):
+    vault = make_vault(git_vault)
+    parsed = []
+    parse_markdown_file = autoindex.parse_markdown_file
+
+    def record_parse(path, content):
+        parsed.append(Path(path).name)
+        return parse_markdown_file(path, content)
+
+    monkeypatch.setattr(autoindex, "parse_markdown_file", record_parse)
+    (vault / "C.md").write_text("Also part of [[Hub]].\n")
+    run_autoindex(vault, changed_since="snapshot")
+
+    assert "- [[C]]\n" in (vault / "Hub.md").read_text()
+    assert "Other.md" not in parsed
+    assert "B.md" not in parsed
+
+
+def make_backlinks(count: int):
+    start = datetime.datetime(2024, 1, 1)
+    return [
+        MarkdownFile(
+            f"/vault/Note {idx}.md",
+            f"Note {idx}",
+            [],
+            created_at=start + datetime.timedelta(hours=idx),
+            # Distinct from the creation order, with ties broken by title.
+            modified_at=start + datetime.timedelta(days=(idx * 7) % 13),
+        )
+        for idx in range(count)
+    ]
+
+
+def test_selection_attributes_fall_back_on_invalid_values():
+    assert get_selection_from_autoindex(
+        AutoindexConfig("", {"sort": "title", "order": "desc", "limit": "5"})
+    ) == ("title", "desc", 5)
+    for filters in [{"sort": "size"}, {"order": "up"}, {"limit": "-1"}, {"limit": "0"}, {"limit": "x"}]:
+        assert get_selection_from_autoindex(AutoindexConfig("", filters)) == ("modified", "asc", None)
+
+
+@pytest.mark.parametrize("sort", ["modified", "created", "title"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("limit", [1, 5, 40, 100])
+def test_top_k_matches_a_full_sort(sort, order, limit):
+    backlinks = make_backlinks(40)
+    selected = select_backlinks(backlinks, sort=sort, order=order, limit=limit)
+    full = select_backlinks(backlinks, sort=sort, order=order)
+
+    keys = [SORT_KEYS[sort](file) for file in selected]
+    assert keys == [SORT_KEYS[sort](file) for file in full[:limit]]
+
+
+def test_empty_list_renders_the_placeholder():
+    assert render_backlinks_to_markdown_list([], limit=3) == ["- No entries yet.\n"]
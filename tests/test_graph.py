@@ -0,0 +1,30 @@
+from notectl.autoindex import parse_markdown_file
+from notectl.graph import build_graph_report
+
+
+def make_index(tmp_path, notes: dict):
+    index = {}
+    for title, content in notes.items():
+        path = tmp_path / f"{title}.md"
+        path.write_text(content)
+        index[title] = parse_markdown_file(str(path), content)
+    return index
+
+
+def test_report_finds_orphans_dead_links_and_hubs(tmp_path):
+    index = make_index(
+        tmp_path,
+        {
+            "Hub": "# Hub\nSee [[#Top]].\n",
+            "A": "[[Hub]] and [[Hub#Section]] and [[Missing]]\n",
+            "B": "[[folder/Hub]] and [[Target#^block|alias]]\n",
+            "Target": "Nothing here.\n",
+            "Lonely": "[[Hub.md]]\n",
+        },
+    )
+
+    report = build_graph_report(index, top=2)
+
+    assert report.hubs == [("Hub", 3), ("Target", 1)]
+    assert report.dead_links == [("A", "Missing")]
+    assert report.orphans == ["A", "B", "Lonely"]
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from notectl.lock import RunLock, run_exclusively
+
+
+def test_follow_up_survives_exit_from_the_run(tmp_path):
+    lock = RunLock(tmp_path)
+    calls = []
+
+    def run():
+        calls.append(1)
+        if len(calls) == 1:
+            # Another trigger fires while this run is in progress.
+            lock.request_follow_up("autoindex_run")
+            exit(0)
+
+    run_exclusively(tmp_path, "autoindex_run", run)
+
+    assert len(calls) == 2
+    assert not lock.path.exists()
+
+
+def test_failing_run_still_raises_after_follow_up(tmp_path):
+    def run():
+        exit(1)
+
+    with pytest.raises(SystemExit) as exit_info:
+        run_exclusively(tmp_path, "autoindex_run", run)
+
+    assert exit_info.value.code == 1
+    assert not RunLock(tmp_path).path.exists()
+
+
+def test_same_command_is_coalesced_into_a_follow_up(tmp_path, hold_lock):
+    lock = RunLock(tmp_path)
+    hold_lock(tmp_path, "autoindex_run")
+    calls = []
+    run_exclusively(tmp_path, "autoindex_run", lambda: calls.append(1))
+
+    assert calls == []
+    assert lock.take_follow_up("autoindex_run")
+
+
+def test_uncoalesced_command_waits_instead_of_being_dropped(tmp_path, hold_lock):
+    lock = RunLock(tmp_path)
+    # The other rename finishes a moment later.
+    hold_lock(tmp_path, "rename", finish_after=0.2)
+    calls = []
+    run_exclusively(tmp_path, "rename", lambda: calls.append(1), coalesce=False)
+
+    assert calls == [1]
+    assert not lock.take_follow_up("rename")
+
+
+def test_stale_lock_is_broken(tmp_path, hold_lock):
+    lock = RunLock(tmp_path)
+    process = hold_lock(tmp_path, "autoindex_run")
+    process.kill()
+    process.wait()
+
+    assert lock.try_acquire("autoindex_run")
+    assert lock.read_holder()["pid"] == os.getpid()
+
+
+def test_live_lock_is_not_broken(tmp_path, hold_lock):
+    lock = RunLock(tmp_path)
+    process = hold_lock(tmp_path, "autoindex_run")
+
+    assert not lock.try_acquire("attachments_tidy")
+    assert lock.read_holder()["pid"] == process.pid
@@ -0,0 +1,93 @@
+import io
+import json
+
+from notectl.lsp import LanguageServer, VaultIndex, find_link_locations
+
+
+def frame(message: dict) -> bytes:
+    body = json.dumps({"jsonrpc": "2.0", **message}).encode("utf-8")
+    return f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+
+
+def read_responses(data: bytes) -> list:
+    responses = []
+    while data:
+        header, _, rest = data.partition(b"\r\n\r\n")
+        length = int(header.split(b":")[1])
+        responses.append(json.loads(rest[:length]))
+        data = rest[length:]
+    return responses
+
+
+def test_failing_notifications_dont_stop_the_server(tmp_path):
+    note = tmp_path / "Note.md"
+    note.write_text("# Note\n")
+    broken = tmp_path / "Broken.md"
+    uri = note.as_uri()
+
+    class Server(LanguageServer):
+        def on_initialize(self, params):
+            result = super().on_initialize(params)
+            # Created after the initial scan, so only didSave trips over it.
+            broken.write_bytes(b"\xff\xfe\x00")
+            return result
+
+    messages = [
+        {"method": "textDocument/didOpen", "params": {"textDocument": {"uri": uri, "text": ""}}},
+        {"id": 1, "method": "initialize", "params": {}},
+        {"method": "textDocument/didSave", "params": {"textDocument": {"uri": broken.as_uri()}}},
+        {"id": 2, "method": "shutdown"},
+    ]
+    stdout = io.BytesIO()
+    Server(tmp_path, stdin=io.BytesIO(b"".join(map(frame, messages))), stdout=stdout).serve()
+
+    responses = read_responses(stdout.getvalue())
+    assert [response["id"] for response in responses] == [1, 2]
+    assert responses[1]["result"] is None
+
+
+def test_positions_count_utf16_code_units(tmp_path):
+    (tmp_path / "Target.md").write_text("# Target\n")
+    source = tmp_path / "Source.md"
+    source.write_text("# Source\n😀 [[Target]]\n")
+    uri = source.as_uri()
+    # The emoji is two UTF-16 code units, so the link spans 3 to 13.
+    messages = [
+        {"id": 1, "method": "initialize", "params": {}},
+        {
+            "id": 2,
+            "method": "textDocument/definition",
+            "params": {"textDocument": {"uri": uri}, "position": {"line": 1, "character": 13}},
+        },
+        {
+            "id": 3,
+            "method": "textDocument/references",
+            "params": {"textDocument": {"uri": uri}, "position": {"line": 1, "character": 13}},
+        },
+    ]
+    stdout = io.BytesIO()
+    LanguageServer(tmp_path, stdin=io.BytesIO(b"".join(map(frame, messages))), stdout=stdout).serve()
+
+    initialize, definition, references = read_responses(stdout.getvalue())
+    assert initialize["result"]["capabilities"]["positionEncoding"] == "utf-16"
+    assert definition["result"]["uri"] == (tmp_path / "Target.md").as_uri()
+    assert references["result"] == [
+        {
+            "uri": uri,
+            "range": {"start": {"line": 1, "character": 3}, "end": {"line": 1, "character": 13}},
+        }
+    ]
+
+
+def test_references_are_answered_from_memory(tmp_path, monkeypatch):
+    (tmp_path / "Target.md").write_text("# Target\n")
+    (tmp_path / "Source.md").write_text("See [[Target]].\n")
+    index = VaultIndex(tmp_path)
+
+    def no_disk_reads(path):
+        raise AssertionError(f"read {path}")
+
+    monkeypatch.setattr(index, "read", no_disk_reads)
+    locations = find_link_locations(index, "Source", "Target")
+
+    assert [location["range"]["start"] for location in locations] == [{"line": 0, "character": 4}]
@@ -0,0 +1,63 @@
+from pathlib import Path
+
+from notectl import autoindex, rename
+from notectl.autoindex import run_autoindex
+from notectl.rename import run_rename
+
+
+def make_vault(vault: Path) -> Path:
+    (vault / "Hub.md").write_text("# Hub\n<autoindex>\n</autoindex>\n")
+    (vault / "A.md").write_text("Part of [[Hub]].\n")
+    (vault / "Z.md").write_text("Unrelated.\n")
+    run_autoindex(vault)
+    return vault
+
+
+def test_rename_updates_lists_of_linked_notes(git_vault):
+    vault = make_vault(git_vault.path)
+    assert "- [[A]]\n" in (vault / "Hub.md").read_text()
+
+    run_rename(vault, "A", "Alpha")
+
+    assert not (vault / "A.md").exists()
+    assert (vault / "Alpha.md").read_text() == "Part of [[Hub]].\n"
+    hub = (vault / "Hub.md").read_text()
+    assert "[[A]]" not in hub
+    assert "- [[Alpha]]\n" in hub
+
+
+def test_rename_keeps_earlier_edits_for_the_next_autoindex_run(git_vault):
+    vault = make_vault(git_vault.path)
+    # Edited after the last autoindex run, and committed by the rename's snapshot.
+    (vault / "D.md").write_text("Also part of [[Hub]].\n")
+
+    run_rename(vault, "Z", "Zed")
+    run_autoindex(vault, changed_since="HEAD")
+
+    assert "- [[D]]\n" in (vault / "Hub.md").read_text()
+
+
+def test_rename_without_git_only_reads_changed_notes(tmp_path, monkeypatch):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    monkeypatch.setattr(autoindex, "take_snapshot", lambda: None)
+    monkeypatch.setattr(rename, "take_snapshot", lambda: None)
+    make_vault(vault)
+    (vault / "B.md").write_text("See [[Z]].\n")
+    run_rename(vault, "Z", "Zed")
+
+    read = []
+    read_markdown_file = autoindex.read_markdown_file
+
+    def record_read(path):
+        read.append(Path(path).name)
+        return read_markdown_file(path)
+
+    monkeypatch.setattr("notectl.link_index.read_markdown_file", record_read)
+    # Edited since the last rename, and now links to the note being renamed.
+    (vault / "C.md").write_text("See [[Zed]].\n")
+    run_rename(vault, "Zed", "Zeta")
+
+    assert read == ["C.md"]
+    assert (vault / "B.md").read_text() == "See [[Zeta]].\n"
+    assert (vault / "C.md").read_text() == "See [[Zeta]].\n"